@@ -0,0 +1,143 @@
+"""Versioned artifact bundles of parsed and indexed facility schedules.
+
+The ingestion job (`local-activities/script.py`) scrapes and parses the
+facility pages, builds the schedule documents and embeds them ahead of time,
+then writes a bundle the graph loads at startup instead of doing that work
+on the first question. A bundle directory looks like
+
+    bundles/
+        CURRENT                      <- name of the latest version
+        20250401T120000Z-1a2b3c4d/
+            manifest.json
+            snapshot.bin             <- pages, documents, keyword index and embeddings
+
+The pages, documents, keyword index and embeddings are kept in a memory
+mapped snapshot file (see `snapshotfile`), so server worker processes
+loading the same version share one copy of them, and loading a version
+parses nothing up front. Bundles written in the
+first format, with `pages.json`, `documents.jsonl` and `embeddings.npy` in
+place of `snapshot.bin`, can still be loaded.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain.schema import Document
+
+from react_agent.documents import content_hash
+from react_agent.retrieval import KeywordIndex
+from react_agent.snapshotfile import MappedSnapshot, write_snapshot
+
+FORMAT_VERSION = 2
+
+
+@dataclass
+class Bundle:
+    """A loaded artifact bundle."""
+
+    version: str
+    manifest: dict
+    pages: Sequence[dict]
+    documents: Sequence[Document]
+    embeddings: Optional[np.ndarray]
+    """One row per document, or None when the bundle was built without them.
+
+    A read only view onto the memory mapped snapshot file.
+    """
+    lexical: Optional[KeywordIndex] = None
+    """The documents' keyword index, when the bundle stores one."""
+
+
+def write_bundle(
+    out_dir: str,
+    pages: list[dict],
+    documents: Sequence[Document],
+    embeddings: Optional[np.ndarray],
+    embedding_model: Optional[str],
+    created_at: Optional[datetime] = None,
+) -> str:
+    """Write a new bundle version and point CURRENT at it.
+
+    The version is written to a temporary directory and renamed into place,
+    and CURRENT is replaced atomically, so a graph starting up never sees a
+    partial bundle.
+
+    Returns:
+        str: The new version's name.
+    """
+    created_at = created_at or datetime.now(tz=timezone.utc)
+    doc_ids = [d.id or content_hash(d.page_content) for d in documents]
+    version = f"{created_at.strftime('%Y%m%dT%H%M%SZ')}-{content_hash(''.join(doc_ids))[:8]}"
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "created_at": created_at.isoformat(),
+        "urls": [p.get("url") for p in pages],
+        "embedding_model": embedding_model if embeddings is not None else None,
+        "documents": len(documents),
+    }
+
+    tmp = os.path.join(out_dir, f".{version}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+    write_snapshot(
+        os.path.join(tmp, "snapshot.bin"),
+        pages,
+        [Document(id=doc_id, page_content=d.page_content, metadata=d.metadata) for doc_id, d in zip(doc_ids, documents)],
+        embeddings,
+    )
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, version))
+
+    with open(os.path.join(out_dir, "CURRENT.tmp"), "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(os.path.join(out_dir, "CURRENT.tmp"), os.path.join(out_dir, "CURRENT"))
+    return version
+
+
+def current_version(bundle_dir: str) -> Optional[str]:
+    """Return the name of the latest version, or None if there is none yet."""
+    try:
+        with open(os.path.join(bundle_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(bundle_dir: str, version: Optional[str] = None) -> Bundle:
+    """Load a bundle version, by default the current one.
+
+    Nothing is read from the snapshot file up front: the embeddings and
+    keyword index are views onto its mapping, and pages and documents are
+    decoded as they are used.
+
+    Raises:
+        FileNotFoundError: When there is no such version.
+        ValueError: When the bundle was written in an unknown format.
+    """
+    version = version or current_version(bundle_dir)
+    if version is None:
+        raise FileNotFoundError(f"No schedule bundle in {bundle_dir}")
+    path = os.path.join(bundle_dir, version)
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") == FORMAT_VERSION:
+        snapshot = MappedSnapshot(os.path.join(path, "snapshot.bin"))
+        return Bundle(
+            version, manifest, snapshot.pages, snapshot.documents(), snapshot.embeddings, snapshot.lexical
+        )
+    if manifest.get("format_version") != 1:
+        raise ValueError(
+            f"Unsupported schedule bundle format {manifest.get('format_version')} in {path}"
+        )
+    with open(os.path.join(path, "pages.json"), encoding="utf-8") as f:
+        pages = json.load(f)
+    with open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as f:
+        documents = [Document(**json.loads(line)) for line in f]
+    embeddings_path = os.path.join(path, "embeddings.npy")
+    embeddings = np.load(embeddings_path) if os.path.exists(embeddings_path) else None
+    return Bundle(version, manifest, pages, documents, embeddings)
@@ -0,0 +1,149 @@
+"""Row level diffs between facility schedule snapshots, and a change feed.
+
+A refresh compares freshly parsed pages against the previous ones record by
+record (see `documents.iter_records`), so only what the city actually edited
+flows on to indexing, embedding and calendar export. Every change is also
+appended to a `ChangeFeed` file that consumers can read from where they
+last left off.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Literal, Optional
+
+from react_agent.documents import iter_records
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+# What identifies a record; time_slots is the value that changes
+KEY_FIELDS = ["url", "location", "category", "time_block_start", "time_block_end", "activity", "day"]
+
+
+@dataclass
+class RecordChange:
+    """One added, removed or changed schedule record."""
+
+    op: Literal["added", "removed", "changed"]
+    key: str
+    record: Optional[dict]
+    """The record as it is now; None when removed."""
+    previous: Optional[dict] = None
+    """The record as it was; None when added."""
+
+
+def keyed_records(pages: Iterable[dict]) -> dict[str, dict]:
+    """Index the records of parsed pages by a stable key.
+
+    Repeated rows for the same activity and day (eg two preschool swim rows
+    in one table) are told apart by their order of appearance.
+    """
+    keyed: dict[str, dict] = {}
+    seen: dict[str, int] = {}
+    for r in iter_records(pages):
+        base = " | ".join(str(r[f]) for f in KEY_FIELDS)
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        keyed[f"{base} #{n}"] = r
+    return keyed
+
+
+def diff_pages(previous: Iterable[dict], current: Iterable[dict]) -> list[RecordChange]:
+    """Compare two lists of parsed pages (see `ottawarec._parse_page`).
+
+    Returns:
+        list: The changes that turn `previous` into `current`; empty when
+        nothing changed.
+    """
+    before, after = keyed_records(previous), keyed_records(current)
+    changes = []
+    for key, record in after.items():
+        if key not in before:
+            changes.append(RecordChange("added", key, record))
+        elif before[key] != record:
+            changes.append(RecordChange("changed", key, record, before[key]))
+    for key, record in before.items():
+        if key not in after:
+            changes.append(RecordChange("removed", key, None, record))
+    return changes
+
+
+class ChangeFeed:
+    """An append-only JSON lines log of record changes.
+
+    Each entry has an increasing `seq`; consumers remember the last one they
+    handled and pass it to `read` to resume.
+
+    Appending takes an exclusive lock on the file and continues from the
+    last entry in it, so several processes can share one feed. Where file
+    locks are unavailable (Windows), only one process may write to a feed.
+    """
+
+    def __init__(self, path: str):
+        """Open (or prepare to create) the feed at the given path."""
+        self.path = path
+        self.last_seq = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.last_seq = _last_entry(f)[1]
+
+    def append(self, changes: Iterable[RecordChange]) -> int:
+        """Append changes to the feed.
+
+        A partial last line, left by a crash mid-write, is dropped first.
+
+        Returns:
+            int: The sequence number of the last entry written.
+        """
+        changes = list(changes)
+        if not changes:
+            return self.last_seq
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            end, self.last_seq = _last_entry(f)
+            f.truncate(end)
+            at = datetime.now(tz=timezone.utc).isoformat()
+            lines = []
+            for c in changes:
+                self.last_seq += 1
+                lines.append(json.dumps({"seq": self.last_seq, "at": at, **asdict(c)}))
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            f.flush()
+        return self.last_seq
+
+    def read(self, since: int = 0) -> list[dict]:
+        """Return the entries after sequence number `since`, oldest first."""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                # a crash mid-write can leave a partial last line
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                if entry["seq"] > since:
+                    entries.append(entry)
+        return entries
+
+
+def _last_entry(f: BinaryIO, block: int = 4096) -> tuple[int, int]:
+    # (end of the last complete line, its seq), reading back from the end
+    position = f.seek(0, os.SEEK_END)
+    tail = b""
+    while position > 0 and tail.count(b"\n") < 2:
+        step = min(block, position)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+    end = tail.rfind(b"\n") + 1
+    if not end:
+        return 0, 0
+    line = tail[: end - 1].rsplit(b"\n", 1)[-1]
+    return position + end, json.loads(line)["seq"]
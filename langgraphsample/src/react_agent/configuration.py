@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, field, fields
 from typing import List, Annotated, Optional
 
@@ -14,6 +15,7 @@ OTT_REC_FACILITY_URLS = [
     "https://ottawa.ca/en/recreation-and-parks/facilities/place-listing/walter-baker-sports-centre",
     "https://ottawa.ca/en/recreation-and-parks/facilities/place-listing/minto-recreation-complex-barrhaven",
 ]
+DEFAULT_EMBEDDING_MODEL = "openai/text-embedding-ada-002"
 
 @dataclass(kw_only=True)
 class Configuration:
@@ -35,6 +37,14 @@ class Configuration:
         },
     )
 
+    embedding_model: str = field(
+        default=DEFAULT_EMBEDDING_MODEL,
+        metadata={
+            "description": "The name of the embedding model used to search facility schedules. "
+            "Should be in the form: provider/model-name. Use 'local/hashing' to embed locally, without network access."
+        },
+    )
+
     max_search_results: int = field(
         default=10,
         metadata={
@@ -42,6 +52,13 @@ class Configuration:
         },
     )
 
+    max_tool_result_tokens: int = field(
+        default=400,
+        metadata={
+            "description": "Approximate token cap on each schedule tool result. The least relevant rows are dropped first."
+        },
+    )
+
     ott_rec_facility_urls: List[str] = field(
         default_factory=lambda: OTT_REC_FACILITY_URLS,
         metadata={
@@ -49,6 +66,70 @@ class Configuration:
         },
     )
 
+    lexical_confidence_threshold: float = field(
+        default=0.5,
+        metadata={
+            "description": "How confident (0 to 1) keyword retrieval of schedules must be before "
+            "the embedding search is skipped. Lower values make fewer embedding requests."
+        },
+    )
+
+    llm_max_concurrency: int = field(
+        default=8,
+        metadata={
+            "description": "The most model and embedding requests in flight at once across all graph runs in this process."
+        },
+    )
+
+    llm_tokens_per_minute: int = field(
+        default=0,
+        metadata={
+            "description": "Estimated tokens per minute that model and embedding requests may use across all graph runs "
+            "in this process. 0 for no limit."
+        },
+    )
+
+    schedule_prefetch: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to start fetching facility schedules while the model is still deciding "
+            "whether to use a schedule tool, for messages that look like schedule questions."
+        },
+    )
+
+    schedule_max_age_seconds: float = field(
+        default=300,
+        metadata={
+            "description": "How long fetched facility schedules are reused before the pages are fetched again."
+        },
+    )
+
+    schedule_state_dir: str = field(
+        default="",
+        metadata={
+            "description": "Directory to keep the last fetched schedules and the change feed (changes.jsonl) in. "
+            "Leave empty to keep them in memory only."
+        },
+    )
+
+    schedule_bundle_dir: str = field(
+        default_factory=lambda: os.environ.get("SCHEDULE_BUNDLE_DIR", ""),
+        metadata={
+            "description": "Directory of schedule bundles written by the ingestion job (local-activities/script.py). "
+            "When set, schedules are served from the latest bundle instead of being fetched by the agent. "
+            "Defaults to the SCHEDULE_BUNDLE_DIR environment variable."
+        },
+    )
+
+    memory_diagnostics: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to record memory use (tracemalloc, resident memory and the sizes of the "
+            "checkpointer, caches and indexes) at the end of every graph run and log it with the diagnostics "
+            "metrics. Slows every run; meant for investigating leaks."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -0,0 +1,70 @@
+"""Process wide counters and measurements for the agent.
+
+Components record what they do (eg rate limit retries, coalesced embedding
+requests) and how big they are (see `memory`) into the shared `METRICS`, and `log_metrics` reports everything
+through the `react_agent.diagnostics` logger, so one place shows how the
+agent is behaving.
+"""
+
+import logging
+import threading
+from typing import Any
+
+logger = logging.getLogger("react_agent.diagnostics")
+
+
+class Metrics:
+    """Thread safe counters and value summaries (count, total, max)."""
+
+    def __init__(self) -> None:
+        """Start with nothing recorded."""
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._observations: dict[str, dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Add to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value: float) -> None:
+        """Set a value that goes up and down, eg a cache's size."""
+        with self._lock:
+            self._counters[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one measurement, eg a wait time in seconds."""
+        with self._lock:
+            o = self._observations.setdefault(name, {"count": 0, "total": 0.0, "max": value})
+            o["count"] += 1
+            o["total"] += value
+            o["max"] = max(o["max"], value)
+
+    def get(self, name: str) -> float:
+        """Return a counter's value, 0 if never incremented."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a copy of every counter and measurement summary."""
+        with self._lock:
+            return {
+                **self._counters,
+                **{k: dict(v) for k, v in self._observations.items()},
+            }
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+
+
+METRICS = Metrics()
+
+
+def log_metrics(level: int = logging.INFO) -> dict[str, Any]:
+    """Log a snapshot of `METRICS` and return it."""
+    snapshot = METRICS.snapshot()
+    logger.log(level, "metrics %s", snapshot)
+    return snapshot
@@ -0,0 +1,90 @@
+"""Turn parsed facility pages into retrieval documents.
+
+A parsed page (see `ottawarec._parse_page`) nests activity time slots inside
+time blocks. Rather than splitting its string form into arbitrary chunks,
+each (location, activity, day) gets one short document that answers the
+question on its own, eg
+
+    Preschool swim at Walter Baker Sports Centre on Tuesday: 10 - 11am (January 28 to March 21); 8 - 9am (March 22 to June 22)
+"""
+
+import hashlib
+from typing import Iterable, Iterator
+
+from langchain.schema import Document
+
+RECORD_FIELDS = ["location", "activity", "day", "time_slots", "category", "time_block_start", "time_block_end", "url"]
+
+
+def iter_records(pages: Iterable[dict]) -> Iterator[dict]:
+    """Flatten parsed pages into one flat dict per schedule table cell.
+
+    Each record carries every field in `RECORD_FIELDS`; time block fields are
+    None when the table caption had no date range.
+    """
+    for page in pages:
+        for block in page["time_blocks"]:
+            for a in block["activities"]:
+                yield {
+                    "location": a["location"],
+                    "activity": a["activity"],
+                    "day": a["day"],
+                    "time_slots": a["time_slots"],
+                    "category": block.get("category"),
+                    "time_block_start": block.get("time_block_start"),
+                    "time_block_end": block.get("time_block_end"),
+                    "url": page.get("url"),
+                }
+
+
+def content_hash(text: str) -> str:
+    """Return a short stable hash of some text, used as a document id."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def document_group(item: dict) -> tuple[str, str, str]:
+    """Return the (location, activity, day) a record or document belongs to.
+
+    Accepts either a record or a document's metadata.
+    """
+    return (item["location"], item["activity"], item["day"])
+
+
+def build_documents(pages: Iterable[dict]) -> list[Document]:
+    """Build one self-describing document per (location, activity, day).
+
+    Identical records, eg from a facility listed twice, are described once.
+    """
+    return build_documents_from_records(iter_records(pages))
+
+
+def build_documents_from_records(records: Iterable[dict]) -> list[Document]:
+    """Build documents from records, eg only those affected by a change."""
+    grouped: dict[tuple[str, str, str], list[dict]] = {}
+    for r in records:
+        grouped.setdefault(document_group(r), []).append(r)
+
+    documents = []
+    for (location, activity, day), group in grouped.items():
+        slots = "; ".join(dict.fromkeys(_describe_slot(r) for r in group))
+        text = f"{activity} at {location} on {day}: {slots}"
+        documents.append(Document(
+            id=content_hash(text),
+            page_content=text,
+            metadata={
+                "location": location,
+                "activity": activity,
+                "day": day,
+                "time_slots": slots,
+                "category": group[0]["category"],
+                "url": group[0]["url"],
+            },
+        ))
+    return documents
+
+
+def _describe_slot(record: dict) -> str:
+    start, end = record["time_block_start"], record["time_block_end"]
+    if start and end:
+        return f"{record['time_slots']} ({start} to {end})"
+    return record["time_slots"]
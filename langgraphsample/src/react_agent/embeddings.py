@@ -0,0 +1,65 @@
+"""Local embeddings that need no network or API key.
+
+`HashingEmbeddings` maps text to a fixed size vector by hashing its words and
+character n-grams into buckets (the "hashing trick"). It is far less
+semantic than a hosted model, but schedule documents and questions share
+most of their vocabulary (facility names, activities, weekdays), which is
+what it captures well.
+"""
+
+import re
+import zlib
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class HashingEmbeddings(Embeddings):
+    """Hashed word and character n-gram embeddings computed with NumPy."""
+
+    def __init__(self, size: int = 128, ngram_range: tuple[int, int] = (3, 5)):
+        """Configure the vector size and character n-gram lengths.
+
+        Args:
+            size (int): Number of dimensions (hash buckets).
+            ngram_range (tuple[int, int]): Inclusive range of character
+                n-gram lengths taken from each word.
+        """
+        self.size = size
+        self.ngram_range = ngram_range
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a (len(texts), size) float32 matrix of unit rows."""
+        matrix = np.zeros((len(texts), self.size), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            # the top bit picks a sign so that collisions tend to cancel out
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashes % self.size, signs)
+        # sublinear term frequency, then unit length so dot product is cosine
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search documents."""
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed query text."""
+        return self.embed_matrix([text])[0].tolist()
+
+    def _features(self, text: str) -> list[str]:
+        low, high = self.ngram_range
+        features = []
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            features.append(word)
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
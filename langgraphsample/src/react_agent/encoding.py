@@ -0,0 +1,125 @@
+"""Compact text encodings of tool results.
+
+Whatever a tool returns is appended to the conversation and sent back to
+the model on every later step, so schedule results are encoded as a small
+table rather than prose: each location and activity is named once as a
+header, followed by one line per day, eg
+
+    Walter Baker Sports Centre | Preschool swim
+    Tue: 10 - 11am (January 28 to March 21); 8 - 9am (March 22 to June 22)
+    Sun: 12pm - 2pm (January 28 to March 21)
+
+Results are capped at a token budget. Rows are given in order of relevance,
+so when the budget runs out it is the least relevant rows that are dropped,
+and a final line says how many were left out. A most relevant row that does
+not fit on its own is cut short, so the budget is never exceeded.
+"""
+
+from typing import Mapping, Sequence
+
+from langchain.schema import Document
+
+from react_agent.utils import approximate_tokens
+
+NO_RESULTS = "No matching schedules found."
+
+MIN_SECTION_TOKENS = 32
+"""Budget a batch query's results need besides their heading: about one
+location header, one row and the line counting the rows left out."""
+
+
+def encode_schedule(documents: Sequence[Document], max_tokens: int) -> str:
+    """Encode schedule documents, most relevant first, within a token budget.
+
+    Args:
+        documents (Sequence[Document]): Documents from `documents.build_documents`,
+            most relevant first.
+        max_tokens (int): Approximate budget for the whole encoding.
+    """
+    if not documents:
+        return _truncate(NO_RESULTS, max_tokens)
+    groups: dict[tuple[str, str], list[str]] = {}
+    used = 0
+    kept = 0
+    for doc in documents:
+        header = (str(doc.metadata.get("location", "")), str(doc.metadata.get("activity", "")))
+        row = _row(doc)
+        header_cost = 0 if header in groups else approximate_tokens(" | ".join(header))
+        # leave room for the line saying how many rows were left out
+        left_out = len(documents) - kept - 1
+        reserve = approximate_tokens(_omitted(left_out)) if left_out else 0
+        if used + header_cost + approximate_tokens(row) + reserve > max_tokens:
+            if kept:
+                break
+            # rather than return nothing, cut the most relevant row to fit
+            row = _truncate(row, max_tokens - header_cost - reserve)
+            if not row:
+                break
+        groups.setdefault(header, []).append(row)
+        used += header_cost + approximate_tokens(row)
+        kept += 1
+
+    lines = []
+    for (location, activity), rows in groups.items():
+        lines.append(" | ".join(h for h in (location, activity) if h))
+        lines.extend(rows)
+    if kept < len(documents):
+        lines.append(_omitted(len(documents) - kept))
+    # only budgets too small for even the omitted line are cut here
+    return _truncate("\n".join(lines), max_tokens)
+
+
+def encode_batch(results: Mapping[str, Sequence[Document]], max_tokens: int) -> str:
+    """Encode the results of several queries, sharing the budget between them.
+
+    Each query's section, with its "# query" heading and the blank line
+    separating it from the next, gets an equal share of `max_tokens`. When
+    the shares would leave a query less than `MIN_SECTION_TOKENS` for its
+    results, the last (least relevant) queries are left out instead and a
+    final line says how many.
+    """
+    if not results:
+        return _truncate(NO_RESULTS, max_tokens)
+    keys = list(results)
+    share = 0
+    kept = len(keys)
+    while kept:
+        omitted = len(keys) - kept
+        # one token pays for each separating blank line
+        budget = max_tokens - (approximate_tokens(_omitted_queries(omitted)) + 1 if omitted else 0)
+        share = budget // kept - 1
+        if all(share - approximate_tokens(f"# {key}") >= MIN_SECTION_TOKENS for key in keys[:kept]):
+            break
+        kept -= 1
+
+    sections = [
+        f"# {key}\n{encode_schedule(results[key], share - approximate_tokens(f'# {key}'))}"
+        for key in keys[:kept]
+    ]
+    if kept < len(keys):
+        sections.append(_omitted_queries(len(keys) - kept))
+    return _truncate("\n\n".join(sections), max_tokens)
+
+
+def _row(doc: Document) -> str:
+    day = str(doc.metadata.get("day", ""))
+    slots = doc.metadata.get("time_slots")
+    if not day or not slots:
+        return doc.page_content
+    return f"{day[:3]}: {slots}"
+
+
+def _omitted(rows: int) -> str:
+    return f"(+{rows} less relevant rows omitted)"
+
+
+def _omitted_queries(queries: int) -> str:
+    return f"(+{queries} less relevant queries omitted; ask for them separately)"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # the longest prefix, marked with an ellipsis, within the budget
+    if approximate_tokens(text) <= max_tokens:
+        return text
+    chars = 4 * max_tokens - 1
+    return text[: chars - 1] + "…" if chars > 1 else ""
@@ -0,0 +1,375 @@
+"""A synthetic Ottawa recreation facility site for offline scale testing.
+
+The scraper in `ottawarec` has only been run against a couple of live
+pages. This module generates any number of realistic facility pages in the
+markup the parser expects, along with what the parser should make of each,
+and serves them from a local HTTP server that can be made slow, flaky,
+throttled and ETag aware, eg
+
+    python -m react_agent.fakesite --facilities 2000 --latency 0.05 --error-rate 0.01
+
+fetches and parses every page twice, the second time through the fetcher's
+ETag cache, and reports the throughput and what the server saw. With
+`--serve` it only serves the pages, to point `ott_rec_facility_urls` at.
+
+Generated pages vary the number of tables, caption formats (with and without
+a date range, and locations with a dash in their name, eg "Minto Recreation
+Complex - Barrhaven"), header rows with and without a blank first column,
+"n/a" and "Noon" cells, tables without a caption and Schedule Changes
+sections given as paragraphs or lists.
+"""
+
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from react_agent.diagnostics import METRICS, Metrics
+from react_agent.documents import content_hash
+
+logger = logging.getLogger(__name__)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+_NAMES = ["Walter Baker", "Minto", "Nepean", "Kanata", "Richcraft", "Plant", "Champagne", "Jack Purcell", "Bob MacQuarrie", "Goulbourn", "Hintonburg", "Alta Vista", "Ray Friel", "Francois Dupuis", "Sawmill Creek"]
+_KINDS = ["Sports Centre", "Recreation Complex", "Recreation Centre", "Pool", "Community Centre"]
+_AREAS = ["Barrhaven", "Orleans", "Stittsville", "Riverside South", "Bayshore", "Vanier"]
+_SWIM_CATEGORIES = ["swim and aquafit", "Swim", "Swimming and water fitness"]
+_OTHER_CATEGORIES = ["Weight and cardio room", "sports", "Skating", "Fitness classes"]
+_SWIM_ACTIVITIES = ["Preschool swim", "Preschool swim (with caregiver)", "Lane swim", "Public swim", "Aquafit - shallow", "Family swim"]
+_OTHER_ACTIVITIES = ["Pickleball", "Badminton", "Drop-in basketball", "Public skating", "Cardio room"]
+_SLOTS = ["10 - 11am", "9:30 - 10:30am", "Noon - 1pm", "1 - 2:30pm", "6 - 7pm", "10 - 11am, 1 - 2pm", "7:15 - 8:15pm"]
+_CHANGES = ["The pool is closed for annual maintenance.", "Closed for Good Friday", "Lane swim cancelled for a swim meet", "Preschool swim moves to the teach pool"]
+
+
+@dataclass
+class FacilityPage:
+    """A generated facility page and what `ottawarec.parse_html` should return for it."""
+
+    path: str
+    html: str
+    location: str
+    time_blocks: list[dict]
+    schedule_changes: list[dict]
+
+    def expected(self, url: str) -> dict:
+        """Return the parsed page expected when the page is fetched from `url`."""
+        return {
+            "location": self.location,
+            "time_blocks": self.time_blocks,
+            "schedule_changes": self.schedule_changes,
+            "url": url,
+        }
+
+
+def generate_site(facilities: int, seed: int = 0) -> dict[str, FacilityPage]:
+    """Generate facility pages keyed by their path, eg "/en/facility/kanata-pool-12".
+
+    The same arguments always generate the same pages.
+    """
+    rng = random.Random(seed)
+    site = {}
+    for n in range(facilities):
+        page = generate_facility(rng, n)
+        site[page.path] = page
+    return site
+
+
+def generate_facility(rng: random.Random, n: int = 0) -> FacilityPage:
+    """Generate one facility page."""
+    location = f"{rng.choice(_NAMES)} {rng.choice(_KINDS)}"
+    if rng.random() < 0.25:
+        location = f"{location} - {rng.choice(_AREAS)}"
+    path = f"/en/facility/{_slug(location)}-{n}"
+
+    tables, time_blocks = [], []
+    for _ in range(rng.randint(1, 5)):
+        html, block = _table(rng, location)
+        tables.append(html)
+        if block is not None:
+            time_blocks.append(block)
+    if rng.random() < 0.1:
+        # eg a layout table; its caption, if any, names no category
+        tables.insert(rng.randrange(len(tables) + 1), "<table><tbody><tr><td>Book online</td></tr></tbody></table>")
+
+    changes_html, schedule_changes = _schedule_changes(rng)
+    html = "\n".join([
+        "<!DOCTYPE html><html><head><title>" + escape(location) + " | City of Ottawa</title></head><body>",
+        f"<h1>\n  {escape(location)}\n</h1>",
+        "<p>Address: 100 Main Street, Ottawa</p>",
+        changes_html,
+        "<h2>Drop-in schedules</h2>",
+        *tables,
+        "<h2>Contact us</h2><p>Phone: 613-555-0100</p>",
+        "</body></html>",
+    ])
+    return FacilityPage(path, html, location, time_blocks, schedule_changes)
+
+
+def _table(rng: random.Random, location: str) -> tuple[str, Optional[dict]]:
+    swim = rng.random() < 0.7
+    category = rng.choice(_SWIM_CATEGORIES if swim else _OTHER_CATEGORIES)
+    dated = rng.random() < 0.8
+    start = end = None
+    caption = f"{location} - {category}"
+    if dated:
+        month = rng.randrange(11)
+        start = f"{MONTHS[month]} {rng.randint(1, 28)}"
+        end = f"{MONTHS[rng.randint(month + 1, 11)]} {rng.randint(1, 28)}"
+        caption += f" - {start} to {end}"
+
+    days = rng.sample(DAYS, rng.randint(5, 7)) if rng.random() < 0.2 else list(DAYS)
+    days.sort(key=DAYS.index)
+    blank_first = len(days) == 7 and rng.random() < 0.7
+    head = ("<th>&nbsp;</th>" if blank_first else "") + "".join(f"<th>{d}</th>" for d in days)
+
+    activities_pool = _SWIM_ACTIVITIES if swim else _OTHER_ACTIVITIES
+    rows, records = [], []
+    for activity in rng.sample(activities_pool, rng.randint(1, min(4, len(activities_pool)))):
+        cells = []
+        for day in days:
+            slots = "n/a" if rng.random() < 0.4 else rng.choice(_SLOTS)
+            cells.append(f"<td>{slots}</td>" if rng.random() < 0.8 else f"<td>\n\t{slots}&nbsp;</td>")
+            if slots != "n/a" and "preschool swim" in activity.lower():
+                records.append({
+                    "location": location,
+                    "activity": activity,
+                    "day": day,
+                    "time_slots": slots.replace("Noon", "12pm"),
+                })
+        rows.append(f"<tr><th>{escape(activity)}</th>{''.join(cells)}</tr>")
+
+    html = (
+        f"<table>\n<caption>{escape(caption)}</caption>\n"
+        f"<thead><tr>{head}</tr></thead>\n<tbody>\n" + "\n".join(rows) + "\n</tbody>\n</table>"
+    )
+    # only swim tables are kept, and only their preschool swim rows
+    if "swim" not in category.lower():
+        return html, None
+    return html, {"category": category, "time_block_start": start, "time_block_end": end, "activities": records}
+
+
+def _schedule_changes(rng: random.Random) -> tuple[str, list[dict]]:
+    if rng.random() < 0.5:
+        return "", []
+    changes, items = [], []
+    for _ in range(rng.randint(1, 3)):
+        month = rng.randrange(12)
+        start = f"{MONTHS[month]} {rng.randint(1, 28)}"
+        description = rng.choice(_CHANGES)
+        if rng.random() < 0.5:
+            end = f"{MONTHS[month]} {rng.randint(1, 28)}"
+            items.append(f"{start} to {end} {description}")
+        else:
+            end = start
+            items.append(f"{start}: {description}")
+        changes.append({"start": start, "end": end, "description": description})
+    if rng.random() < 0.5:
+        body = "".join(f"<p>{escape(i)}</p>" for i in items)
+    else:
+        body = "<ul>" + "".join(f"<li>{escape(i)}</li>" for i in items) + "</ul>"
+    heading = rng.choice(["h2", "h3"])
+    return f"<{heading}>Schedule changes</{heading}>{body}", changes
+
+
+def _slug(text: str) -> str:
+    return "-".join("".join(c if c.isalnum() else " " for c in text.lower()).split())
+
+
+class FakeSiteServer:
+    """Serves generated pages over HTTP on localhost.
+
+    Every response carries an ETag, and a request whose If-None-Match
+    matches gets a 304. What the server did is counted in `metrics`:
+    requests, ok, not_modified, errors, throttled and not_found.
+
+    Use as a context manager, or call `start` and `stop`.
+    """
+
+    def __init__(
+        self,
+        pages: dict[str, str],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        requests_per_second: float = 0.0,
+        seed: int = 0,
+    ):
+        """Configure the server.
+
+        Args:
+            pages (dict[str, str]): HTML keyed by path; may be changed while
+                serving, eg to test change detection.
+            latency (float): Seconds to wait before answering each request.
+            error_rate (float): Fraction of requests answered with a 503.
+            requests_per_second (float): Requests allowed per second before
+                answering 429 with a Retry-After; 0 for no limit.
+            seed (int): Seeds which requests fail.
+        """
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests_per_second = requests_per_second
+        self.metrics = Metrics()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._allowance = requests_per_second
+        self._checked_at = time.monotonic()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        """The url the server is listening on, eg http://127.0.0.1:53211.
+
+        Raises:
+            RuntimeError: When the server is not running.
+        """
+        if self._httpd is None:
+            raise RuntimeError("The server is not running")
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def url(self, path: str) -> str:
+        """Return the full url of a page's path."""
+        return self.base_url + path
+
+    def start(self) -> "FakeSiteServer":
+        """Start serving on a free port in a background thread."""
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "FakeSiteServer":
+        """Start serving."""
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        """Stop serving."""
+        self.stop()
+
+    def _respond(self, path: str, if_none_match: Optional[str]) -> tuple[int, dict, bytes]:
+        self.metrics.incr("requests")
+        with self._lock:
+            throttled = not self._take_token()
+            failed = self._rng.random() < self.error_rate
+        if throttled:
+            self.metrics.incr("throttled")
+            return 429, {"Retry-After": "1"}, b""
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            self.metrics.incr("errors")
+            return 503, {}, b"<h1>Service unavailable</h1>"
+        html = self.pages.get(path)
+        if html is None:
+            self.metrics.incr("not_found")
+            return 404, {}, b"<h1>Not found</h1>"
+        etag = f'"{content_hash(html)}"'
+        if if_none_match == etag:
+            self.metrics.incr("not_modified")
+            return 304, {"ETag": etag}, b""
+        self.metrics.incr("ok")
+        return 200, {"ETag": etag, "Content-Type": "text/html; charset=utf-8"}, html.encode("utf-8")
+
+    def _take_token(self) -> bool:
+        if not self.requests_per_second:
+            return True
+        now = time.monotonic()
+        self._allowance = min(
+            self.requests_per_second,
+            self._allowance + (now - self._checked_at) * self.requests_per_second,
+        )
+        self._checked_at = now
+        if self._allowance < 1:
+            return False
+        self._allowance -= 1
+        return True
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                status, headers, body = site._respond(self.path, self.headers.get("If-None-Match"))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Measure fetch and parse throughput against a generated site, or serve one."""
+    from react_agent import ottawarec
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facilities", type=int, default=1000, help="number of facility pages to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--requests-per-second", type=float, default=0.0, help="throttle above this rate with 429s; 0 for no limit")
+    parser.add_argument("--concurrency", type=int, default=16, help="pages fetched at once")
+    parser.add_argument("--serve", action="store_true", help="only serve the pages until interrupted")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    site = generate_site(args.facilities, args.seed)
+    server = FakeSiteServer(
+        {path: page.html for path, page in site.items()},
+        latency=args.latency,
+        error_rate=args.error_rate,
+        requests_per_second=args.requests_per_second,
+        seed=args.seed,
+    )
+    with server:
+        if args.serve:
+            logger.info("Serving %d facilities at %s, eg %s", len(site), server.base_url, server.url(next(iter(site))))
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                return 0
+
+        def fetch(path: str) -> bool:
+            try:
+                page = ottawarec.fetch_page(server.url(path))
+            except Exception:
+                return False
+            if page != site[path].expected(server.url(path)):
+                METRICS.incr("fakesite.mismatched")
+            return True
+
+        for label in ("cold", "cached"):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                fetched = sum(pool.map(fetch, site))
+            elapsed = time.perf_counter() - started
+            logger.info("%s: %d/%d pages in %.2fs (%.0f pages/s)", label, fetched, len(site), elapsed, fetched / elapsed)
+        logger.info("server %s", server.metrics.snapshot())
+        logger.info("client %s", METRICS.snapshot())
+    return 1 if METRICS.get("fakesite.mismatched") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,323 @@
+"""Shared limits on outbound LLM and embedding requests.
+
+Concurrent graph runs each call the model and embedding providers on their
+own. Under bursty traffic that exceeds the provider's rate limits, and once
+requests start failing with 429 every run retries at the same moment. An
+`LLMGovernor` sits in front of those calls and
+
+- caps how many are in flight and how many tokens are spent per minute,
+- queues the rest, serving higher priority (lower number) requests first,
+- on a 429, pauses everyone for as long as the provider's rate limit headers
+  ask (or an exponential backoff when they say nothing) and halves the
+  concurrency, which then grows back one request at a time, and
+- via `GovernedEmbeddings`, shares one request between callers asking to
+  embed the same texts at the same time.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import BaseMessage
+
+from react_agent.configuration import Configuration
+from react_agent.diagnostics import METRICS
+from react_agent.utils import approximate_tokens, get_message_text
+
+T = TypeVar("T")
+
+# Priorities; lower is served first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+class LLMGovernor:
+    """Concurrency, tokens per minute and rate limit backoff for outbound calls."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        tokens_per_minute: int = 0,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        """Configure the limits.
+
+        Args:
+            max_concurrency (int): Most requests in flight at once.
+            tokens_per_minute (int): Token budget per minute; 0 for no limit.
+            max_retries (int): Retries of a rate limited request before the
+                error is raised to the caller.
+            base_delay (float): First backoff, in seconds, when a 429 gives
+                no hint of how long to wait.
+            max_delay (float): Longest pause, in seconds.
+        """
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = float(max_concurrency)
+        """Current concurrency limit; lowered on rate limits, recovers on success."""
+        self.in_flight = 0
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future, int]] = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot."""
+        return sum(1 for w in self._waiters if not w[2].done())
+
+    async def run(
+        self, call: Callable[[], Awaitable[T]], *, tokens: int = 0, priority: int = INTERACTIVE
+    ) -> T:
+        """Run an outbound call within the limits, retrying on rate limits.
+
+        Args:
+            call (Callable): Creates the request coroutine; called again on retry.
+            tokens (int): Estimated tokens the request will use.
+            priority (int): Lower numbers are served first.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(tokens, priority)
+            try:
+                result = await call()
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                self._rate_limited(delay, attempt)
+                continue
+            finally:
+                self._release()
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            return result
+        raise AssertionError("unreachable")
+
+    async def _acquire(self, tokens: int, priority: int) -> None:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        heapq.heappush(self._waiters, (priority, next(self._order), future, tokens))
+        queued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # a slot granted just as the caller was cancelled must be returned
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        METRICS.observe("llm.queue_wait_seconds", time.monotonic() - queued_at)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        if self.tokens_per_minute:
+            elapsed = now - self._refilled_at
+            self._tokens = min(
+                float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60
+            )
+        self._refilled_at = now
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():  # cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                return
+            wait = self._paused_until - now
+            if self.tokens_per_minute and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= tokens
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _wake_in(self, seconds: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(seconds, self._dispatch)
+
+    def _rate_limited(self, delay: float, attempt: int) -> None:
+        if not delay:
+            # full jitter keeps retries that had no hint from lining up
+            delay = random.uniform(0, self.base_delay * 2**attempt)
+        delay = min(delay, self.max_delay)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.limit = max(1.0, self.limit / 2)
+        METRICS.incr("llm.rate_limited")
+        METRICS.observe("llm.backoff_seconds", delay)
+
+
+class GovernedEmbeddings(Embeddings):
+    """Embeddings whose async requests go through a governor.
+
+    Identical requests made while one is already in flight wait for and
+    share its result instead of being sent again. Only async requests are
+    governed, and the agent makes all of its embedding requests, including
+    indexing the schedule documents, that way. Synchronous calls, as made
+    by offline jobs, go straight to the wrapped model.
+
+    The wrapped model should be created with its own retries turned off
+    (eg `load_embeddings(name, max_retries=0)`), so rate limited requests
+    are retried by the governor rather than while holding a slot.
+    """
+
+    def __init__(
+        self, embeddings: Embeddings, governor: LLMGovernor, priority: int = INTERACTIVE
+    ):
+        """Wrap an embedding model."""
+        self.embeddings = embeddings
+        self.governor = governor
+        self.priority = priority
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+
+    def with_priority(self, priority: int) -> "GovernedEmbeddings":
+        """Return a copy whose requests are submitted at another priority.
+
+        The copy does not share in-flight requests with this one, so an
+        interactive request never ends up waiting on a background one.
+        """
+        return GovernedEmbeddings(self.embeddings, self.governor, priority)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search documents."""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed query text."""
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search documents, sharing identical in-flight requests."""
+        return await self._coalesce(
+            ("documents", *texts), lambda: self.embeddings.aembed_documents(texts), texts
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed query text, sharing identical in-flight requests."""
+        return await self._coalesce(
+            ("query", text), lambda: self.embeddings.aembed_query(text), [text]
+        )
+
+    async def _coalesce(
+        self, key: tuple, call: Callable[[], Awaitable[Any]], texts: Sequence[str]
+    ) -> Any:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.governor.run(
+                call, tokens=sum(len(t) for t in texts) // 4, priority=self.priority
+            ))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            METRICS.incr("embeddings.coalesced")
+        # one caller giving up must not cancel the request for the others
+        return await asyncio.shield(future)
+
+
+def rate_limit_delay(error: BaseException) -> Optional[float]:
+    """Return how long a rate limited request asks to wait.
+
+    Returns:
+        float: Seconds from the response's rate limit headers, 0.0 when it
+        is a 429 without usable headers, or None when it is not a 429.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = {k.lower(): v for k, v in dict(getattr(response, "headers", None) or {}).items()}
+    delays = []
+    if "retry-after-ms" in headers:
+        delays.append(_seconds(lambda: float(headers["retry-after-ms"]) / 1000))
+    if "retry-after" in headers:
+        delays.append(_seconds(lambda: float(headers["retry-after"])) or _http_date_delay(headers["retry-after"]))
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        if name in headers:  # OpenAI, eg "1s", "6m0s", "20ms"
+            delays.append(_duration(headers[name]))
+    for name, value in headers.items():
+        if name.startswith("anthropic-ratelimit-") and name.endswith("-reset"):
+            delays.append(_timestamp_delay(value))
+    return max((d for d in delays if d), default=0.0)
+
+
+def estimate_tokens(messages: Sequence[BaseMessage | dict]) -> int:
+    """Roughly estimate a prompt's tokens."""
+    return approximate_tokens("".join(
+        str(m.get("content", "")) if isinstance(m, dict) else get_message_text(m)
+        for m in messages
+    ))
+
+
+_governors: dict[tuple, LLMGovernor] = {}
+
+
+def get_governor(configuration: Configuration) -> LLMGovernor:
+    """Return the process wide governor for the configured limits."""
+    key = (configuration.llm_max_concurrency, configuration.llm_tokens_per_minute)
+    if key not in _governors:
+        _governors[key] = LLMGovernor(
+            max_concurrency=configuration.llm_max_concurrency,
+            tokens_per_minute=configuration.llm_tokens_per_minute,
+        )
+    return _governors[key]
+
+
+def governor_stats() -> dict[str, int]:
+    """Count the process wide governors and the requests waiting in them."""
+    return {
+        "governors": len(_governors),
+        "queued": sum(g.queued for g in _governors.values()),
+    }
+
+
+def _seconds(parse: Callable[[], float]) -> Optional[float]:
+    try:
+        return max(0.0, parse())
+    except ValueError:
+        return None
+
+
+def _duration(value: str) -> Optional[float]:
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def _http_date_delay(value: str) -> Optional[float]:
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+def _timestamp_delay(value: str) -> Optional[float]:
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
@@ -3,6 +3,7 @@
 Works with a chat model with tool calling support.
 """
 
+import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Literal, cast
 
@@ -12,7 +13,12 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
 
+from react_agent import ottawarec
 from react_agent.configuration import Configuration
+from react_agent.diagnostics import log_metrics
+from react_agent.governor import estimate_tokens, get_governor
+from react_agent.memory import MONITOR
+from react_agent.prefetch import settle_prefetch, start_prefetch
 from react_agent.state import InputState, State
 from react_agent.tools import TOOLS
 from react_agent.utils import load_chat_model
@@ -40,32 +46,42 @@ async def call_model(
     """
     configuration = Configuration.from_runnable_config(config)
 
-    # Initialize the model with tool binding.
-    model = load_chat_model(configuration.model).bind_tools(TOOLS)
+    # Initialize the model with tool binding. Rate limited requests are
+    # retried by the governor, not by the provider's client.
+    model = load_chat_model(configuration.model, max_retries=0).bind_tools(TOOLS)
 
     # Format the system prompt. TODO: Customize this to change the agent's behavior.
     system_message = configuration.system_prompt.format(
         system_time=datetime.now(tz=timezone.utc).isoformat()
     )
 
-    # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages], config
-        ),
-    )
+    # Warm the schedule data while the model decides whether it needs it
+    prefetch = start_prefetch(state.messages, configuration)
+
+    # Get the model's response, within the limits shared by all graph runs
+    messages = [{"role": "system", "content": system_message}, *state.messages]
+    response = None
+    try:
+        response = cast(
+            AIMessage,
+            await get_governor(configuration).run(
+                lambda: model.ainvoke(messages, config), tokens=estimate_tokens(messages)
+            ),
+        )
+    finally:
+        settle_prefetch(prefetch, response)
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and response.tool_calls:
-        return {
-            "messages": [
-                AIMessage(
-                    id=response.id,
-                    content="Sorry, I could not find an answer to your question in the specified number of steps.",
-                )
-            ]
-        }
+        response = AIMessage(
+            id=response.id,
+            content="Sorry, I could not find an answer to your question in the specified number of steps.",
+        )
+
+    # Without tool calls this response ends the run
+    if configuration.memory_diagnostics and not response.tool_calls:
+        MONITOR.record(checkpointer=memory)
+        log_metrics()
 
     # Return the model's response as a list to be added to existing messages
     return {"messages": [response]}
@@ -119,6 +135,14 @@ builder.add_conditional_edges(
 # This creates a cycle: after using tools, we always return to the model
 builder.add_edge("tools", "call_model")
 
+# Start with the schedule index prebuilt by the ingestion job, if configured,
+# rather than scraping and indexing on the first question. A bad bundle is
+# reported again by the first query that needs it, not here
+try:
+    ottawarec.preload(Configuration())
+except Exception:
+    logging.getLogger(__name__).warning("Could not preload the schedule bundle", exc_info=True)
+
 # The checkpointer lets the graph persist its state
 # this is a complete memory for the entire graph.
 memory = MemorySaver()
@@ -0,0 +1,350 @@
+"""Export facility schedules as iCalendar (.ics) feeds.
+
+Each (facility, activity) gets its own feed, eg
+`walter-baker-sports-centre--preschool-swim.ics`, so a family calendar can
+subscribe to just what it needs. Every weekly time slot becomes one event
+with a weekly recurrence rule bounded by its time block (eg January 28 to
+March 21), and closures from the page's Schedule Changes section become
+EXDATEs.
+
+Event UIDs are derived from what identifies a record (facility, time block,
+activity, day) rather than its times, so a rescheduled slot updates the
+existing event instead of creating a new one. `CalendarExporter` remembers
+what it last wrote and only renders events, and rewrites feeds, that
+changed; unchanged feed files keep their modification time, so calendar
+clients polling them with If-Modified-Since do not download them again.
+"""
+
+import json
+import logging
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+
+from react_agent.changes import keyed_records
+from react_agent.documents import content_hash
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+BYDAY = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+TZID = "America/Toronto"
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TZID}",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:-0500",
+    "TZOFFSETTO:-0400",
+    "TZNAME:EDT",
+    "DTSTART:19700308T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:-0400",
+    "TZOFFSETTO:-0500",
+    "TZNAME:EST",
+    "DTSTART:19701101T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+# eg "10 - 11am", "8:30 - 9:15am", "11am - 1pm", "12pm - 2pm"
+_TIME_SLOT = re.compile(
+    r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*(?:-|–|to)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)",
+    re.IGNORECASE,
+)
+
+
+def parse_time_slots(text: str) -> list[tuple[time, time]]:
+    """Parse a schedule cell into (start, end) times.
+
+    A start without am/pm takes the end's, unless that would put it after
+    the end (eg "11 - 1pm" starts at 11am). Cells may hold several slots,
+    eg "9 - 10am, 1 - 2pm".
+    """
+    slots = []
+    for m in _TIME_SLOT.finditer(text.replace("Noon", "12pm").replace("noon", "12pm")):
+        end = _to_time(m.group(4), m.group(5), m.group(6))
+        start = _to_time(m.group(1), m.group(2), m.group(3) or m.group(6))
+        if start > end and not m.group(3):
+            start = _to_time(m.group(1), m.group(2), "am")
+        slots.append((start, end))
+    return slots
+
+
+def parse_month_day(text: str, year: int) -> date:
+    """Parse a caption date such as "January 28" (or "Jan 28", "Sept. 3") in a given year."""
+    cleaned = text.strip().replace(".", "").replace("Sept ", "Sep ")
+    for fmt in ("%B %d %Y", "%b %d %Y"):
+        try:
+            return datetime.strptime(f"{cleaned} {year}", fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {text}")
+
+
+@dataclass
+class CalendarEvent:
+    """A weekly recurring time slot."""
+
+    uid: str
+    feed: str
+    summary: str
+    location: str
+    url: Optional[str]
+    start: datetime
+    """First occurrence, in facility local time."""
+    end: datetime
+    until: Optional[date]
+    """Last day the slot can occur; None when the time block is open ended."""
+    exdates: list[datetime] = field(default_factory=list)
+
+    def content_hash(self) -> str:
+        """Return a hash of everything rendered into the event."""
+        return content_hash(json.dumps(asdict(self), default=str, sort_keys=True))
+
+    def render(self, sequence: int, dtstamp: datetime) -> str:
+        """Render the VEVENT block."""
+        rrule = f"RRULE:FREQ=WEEKLY;BYDAY={BYDAY[self.start.weekday()]}"
+        if self.until:
+            # UNTIL must be UTC with a local DTSTART; the day after at 03:59Z
+            # is late on the last day in Ottawa whether or not DST applies
+            rrule += f";UNTIL={_utc(datetime.combine(self.until + timedelta(days=1), time(3, 59, 59)))}"
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{self.uid}",
+            f"SEQUENCE:{sequence}",
+            f"DTSTAMP:{_utc(dtstamp)}",
+            f"DTSTART;TZID={TZID}:{_local(self.start)}",
+            f"DTEND;TZID={TZID}:{_local(self.end)}",
+            rrule,
+        ]
+        if self.exdates:
+            lines.append(f"EXDATE;TZID={TZID}:" + ",".join(_local(d) for d in self.exdates))
+        lines.append(f"SUMMARY:{_escape(self.summary)}")
+        lines.append(f"LOCATION:{_escape(self.location)}")
+        if self.url:
+            lines.append(f"URL:{self.url}")
+        lines.append("END:VEVENT")
+        return "\r\n".join(_fold(line) for line in lines)
+
+
+def build_events(pages: Iterable[dict], year: int) -> list[CalendarEvent]:
+    """Turn parsed pages into calendar events.
+
+    Caption dates have no year, so time blocks are placed in `year`, and one
+    whose end comes before its start is taken to run into the next year.
+    Open ended blocks start from January 1 of `year`, keeping their events
+    stable for the whole year. Records whose time block dates cannot be read
+    are logged and skipped.
+    """
+    pages = list(pages)
+    closures = {p.get("url"): p.get("schedule_changes", []) for p in pages}
+    events = []
+    for key, record in keyed_records(pages).items():
+        if record["day"] not in WEEKDAYS:
+            continue
+        try:
+            first_day, until = _block_range(record, year)
+        except ValueError as e:
+            logger.warning("Skipping %s: %s", key, e)
+            continue
+        first_day += timedelta(days=(WEEKDAYS.index(record["day"]) - first_day.weekday()) % 7)
+        last_year = (until or first_day).year
+        closed = _closed_days(closures.get(record["url"], []), range(first_day.year, last_year + 1))
+        for n, (start, end) in enumerate(parse_time_slots(record["time_slots"])):
+            occurrence = datetime.combine(first_day, start)
+            exdates = [
+                datetime.combine(d, start) for d in closed
+                if d.weekday() == first_day.weekday() and first_day <= d and (until is None or d <= until)
+            ]
+            events.append(CalendarEvent(
+                uid=f"{content_hash(f'{key} slot {n}')}@ottawarec",
+                feed=f"{_slug(record['location'])}--{_slug(record['activity'])}.ics",
+                summary=f"{record['activity']} ({record['location']})",
+                location=record["location"],
+                url=record["url"],
+                start=occurrence,
+                end=datetime.combine(first_day, end),
+                until=until,
+                exdates=exdates,
+            ))
+    return events
+
+
+@dataclass
+class ExportResult:
+    """What an export wrote."""
+
+    written: list[str] = field(default_factory=list)
+    """Feed files that were (re)written."""
+    unchanged: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    events_rendered: int = 0
+
+
+class CalendarExporter:
+    """Writes .ics feeds to a directory, only touching what changed.
+
+    The UID, content hash, SEQUENCE, DTSTAMP and rendered text of every event
+    are kept in `.ics-state.json` alongside the feeds. An event is only
+    rendered again (with its SEQUENCE bumped) when its content changes, and
+    a feed file is only rewritten when one of its events was added, changed
+    or removed.
+    """
+
+    STATE_FILE = ".ics-state.json"
+
+    def __init__(self, out_dir: str):
+        """Export into the given directory, resuming from its saved state."""
+        self.out_dir = out_dir
+        self.state_path = os.path.join(out_dir, self.STATE_FILE)
+        self.state: dict = {"events": {}, "feeds": {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def export(
+        self, pages: Iterable[dict], year: Optional[int] = None, now: Optional[datetime] = None
+    ) -> ExportResult:
+        """Export parsed pages, writing only the feeds that changed.
+
+        Args:
+            pages (Iterable[dict]): Parsed pages (see `ottawarec._parse_page`).
+            year (int, optional): Year the schedules' dates fall in; defaults
+                to the current year.
+            now (datetime, optional): DTSTAMP for changed events.
+        """
+        now = now or datetime.now(tz=timezone.utc)
+        events = build_events(pages, year or now.year)
+        result = ExportResult()
+        saved = self.state["events"]
+        current: dict[str, dict] = {}
+        feeds: dict[str, list[str]] = {}
+        names: dict[str, str] = {}
+        dirty: set[str] = set()
+        for event in events:
+            if event.uid in current:
+                continue
+            digest = event.content_hash()
+            entry = saved.get(event.uid)
+            if entry is None or entry["hash"] != digest or entry["feed"] != event.feed:
+                sequence = entry["sequence"] + 1 if entry else 0
+                entry = {
+                    "hash": digest,
+                    "feed": event.feed,
+                    "sequence": sequence,
+                    "text": event.render(sequence, now),
+                }
+                result.events_rendered += 1
+                dirty.add(event.feed)
+            current[event.uid] = entry
+            feeds.setdefault(event.feed, []).append(event.uid)
+            names[event.feed] = event.summary
+        # feeds that lost an event need rewriting too
+        dirty.update(e["feed"] for uid, e in saved.items() if uid not in current)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        for feed, uids in sorted(feeds.items()):
+            if feed in dirty or feed not in self.state["feeds"] or not os.path.exists(os.path.join(self.out_dir, feed)):
+                self._write(feed, names[feed], [current[uid]["text"] for uid in sorted(uids)])
+                result.written.append(feed)
+            else:
+                result.unchanged.append(feed)
+        for feed in sorted(set(self.state["feeds"]) - set(feeds)):
+            path = os.path.join(self.out_dir, feed)
+            if os.path.exists(path):
+                os.remove(path)
+            result.removed.append(feed)
+
+        self.state = {"events": current, "feeds": {f: sorted(u) for f, u in feeds.items()}}
+        _write_atomic(self.state_path, json.dumps(self.state))
+        return result
+
+    def _write(self, feed: str, name: str, vevents: list[str]) -> None:
+        lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//react-agent//Ottawa Recreation Schedules//EN",
+            "CALSCALE:GREGORIAN",
+            _fold(f"X-WR-CALNAME:{_escape(name)}"),
+            *VTIMEZONE,
+            *vevents,
+            "END:VCALENDAR",
+        ]
+        _write_atomic(os.path.join(self.out_dir, feed), "\r\n".join(lines) + "\r\n")
+
+
+def _to_time(hour: str, minute: Optional[str], meridiem: str) -> time:
+    h = int(hour) % 12 + (12 if meridiem.lower() == "pm" else 0)
+    return time(h, int(minute or 0))
+
+
+def _block_range(record: dict, year: int) -> tuple[date, Optional[date]]:
+    if not record["time_block_start"] or not record["time_block_end"]:
+        return date(year, 1, 1), None
+    start = parse_month_day(record["time_block_start"], year)
+    end = parse_month_day(record["time_block_end"], year)
+    if end < start:
+        end = parse_month_day(record["time_block_end"], year + 1)
+    return start, end
+
+
+def _closed_days(schedule_changes: list[dict], years: Iterable[int]) -> list[date]:
+    # every year a block spans, as a closure's caption date has no year
+    days: list[date] = []
+    for year in years:
+        for change in schedule_changes:
+            try:
+                start = parse_month_day(change["start"], year)
+                end = parse_month_day(change["end"], year)
+            except ValueError:
+                continue
+            if end < start:
+                end = parse_month_day(change["end"], year + 1)
+            days.extend(start + timedelta(days=n) for n in range((end - start).days + 1))
+    return days
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def _local(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def _utc(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    # lines longer than 75 octets continue on the next line after a space
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts: list[str] = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while (encoded[cut] & 0xC0) == 0x80:  # don't split a UTF-8 character
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def _write_atomic(path: str, text: str) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,157 @@
+"""Opt-in memory footprint instrumentation.
+
+The graph is meant to run for weeks, and several of its parts grow with use:
+the checkpointer keeps every thread's conversation, schedule stores keep
+their snapshots and vector indexes, and the fetcher caches parsed pages.
+With `memory_diagnostics` enabled, the end of every graph run records
+
+- memory.traced_bytes / memory.traced_peak_bytes: Python allocations, from
+  tracemalloc, and memory.traced_growth_bytes: how much they grew since the
+  previous run's tracemalloc snapshot
+- memory.rss_bytes: the process's resident memory
+- memory.<component>: the sizes of the checkpointer, caches and indexes (see
+  `component_sizes`)
+
+into `diagnostics.METRICS` and logs them with the other metrics. At DEBUG
+level, the source lines whose allocations grew most since the previous run
+are logged too. See `soak` for driving many conversations and checking
+that memory stays flat.
+"""
+
+import logging
+import os
+import sys
+import tracemalloc
+from typing import Any, Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+from react_agent import governor, ottawarec, prefetch
+from react_agent.diagnostics import METRICS
+
+logger = logging.getLogger("react_agent.diagnostics")
+
+
+def rss_bytes() -> int:
+    """Return the process's resident memory in bytes.
+
+    Where the current value is unavailable (outside Linux), the peak is
+    returned instead.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def component_sizes(checkpointer: Optional[BaseCheckpointSaver] = None) -> dict[str, float]:
+    """Measure the parts of the agent that grow with use.
+
+    Args:
+        checkpointer (BaseCheckpointSaver, optional): The graph's
+            checkpointer; only in-memory checkpointers are measured.
+
+    Returns:
+        dict: Sizes keyed by component, eg "checkpointer.threads".
+    """
+    sizes: dict[str, float] = {}
+    if isinstance(checkpointer, MemorySaver):
+        sizes["checkpointer.threads"] = len(checkpointer.storage)
+        sizes["checkpointer.checkpoints"] = sum(
+            len(checkpoints) for namespaces in checkpointer.storage.values() for checkpoints in namespaces.values()
+        )
+        sizes["checkpointer.writes"] = sum(len(w) for w in checkpointer.writes.values())
+        sizes["checkpointer.bytes"] = (
+            _serialized_bytes(checkpointer.storage)
+            + _serialized_bytes(checkpointer.writes)
+            + _serialized_bytes(checkpointer.blobs)
+        )
+
+    schedule = ottawarec.store_stats()
+    sizes["schedule.stores"] = schedule["stores"]
+    sizes["schedule.documents"] = schedule["documents"]
+    sizes["schedule.lexical_terms"] = schedule["lexical_terms"]
+    sizes["schedule.vector_bytes"] = schedule["vector_bytes"]
+    sizes["fetch.cached_pages"] = schedule["cached_pages"]
+    llm = governor.governor_stats()
+    sizes["llm.governors"] = llm["governors"]
+    sizes["llm.queued"] = llm["queued"]
+    sizes["prefetch.running"] = prefetch.running()
+    return sizes
+
+
+class MemoryMonitor:
+    """Records memory use after each graph run; see the module docstring."""
+
+    def __init__(self, frames: int = 1, top: int = 10):
+        """Configure the monitor; tracing starts with the first `record`.
+
+        Args:
+            frames (int): Stack frames tracemalloc keeps per allocation.
+            top (int): Source lines reported in the DEBUG growth log.
+        """
+        self.frames = frames
+        self.top = top
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._started = False
+
+    def record(self, checkpointer: Optional[BaseCheckpointSaver] = None) -> dict[str, Any]:
+        """Measure memory use now and record it in `METRICS`.
+
+        Returns:
+            dict: The recorded values.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        traced, peak = tracemalloc.get_traced_memory()
+        report: dict[str, Any] = {
+            "memory.traced_bytes": traced,
+            "memory.traced_peak_bytes": peak,
+            "memory.rss_bytes": rss_bytes(),
+            **{f"memory.{name}": size for name, size in component_sizes(checkpointer).items()},
+        }
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        if self._previous is not None:
+            growth = snapshot.compare_to(self._previous, "lineno")
+            report["memory.traced_growth_bytes"] = sum(s.size_diff for s in growth)
+            logger.debug(
+                "memory growth since the last run:\n%s", "\n".join(str(s) for s in growth[: self.top])
+            )
+        self._previous = snapshot
+
+        for name, value in report.items():
+            METRICS.set(name, value)
+        METRICS.incr("memory.records")
+        return report
+
+    def stop(self) -> None:
+        """Stop tracing, if this monitor started it."""
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._previous = None
+
+
+MONITOR = MemoryMonitor()
+
+
+def _serialized_bytes(value: Any) -> int:
+    # checkpoints are stored serialized, as bytes nested in tuples and dicts
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_serialized_bytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_serialized_bytes(v) for v in value)
+    return 0
@@ -6,21 +6,33 @@ available activities and their times.
 eg Preschool swim on Mondays 11am - 1pm at Minto Barrhaven
 """
 
+import asyncio
+import json
+import os
+import re
 import requests
-from typing import Any, Optional, cast
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Sequence, Union, cast
 from bs4 import BeautifulSoup
 
+from langchain_core.embeddings import Embeddings
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import InjectedToolArg
-from typing_extensions import Annotated
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_openai import OpenAIEmbeddings
+from typing_extensions import Annotated, TypedDict
 from langchain.tools import tool
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain import hub
 
-from react_agent.configuration import Configuration
+from react_agent.bundle import Bundle, current_version, load_bundle
+from react_agent.changes import ChangeFeed, RecordChange, diff_pages
+from react_agent.configuration import DEFAULT_EMBEDDING_MODEL, Configuration
+from react_agent.diagnostics import METRICS
+from react_agent.documents import build_documents, build_documents_from_records, document_group, iter_records
+from react_agent.encoding import encode_batch, encode_schedule
+from react_agent.governor import GovernedEmbeddings, get_governor
+from react_agent.retrieval import Filters, HybridRetriever
+from react_agent.utils import load_embeddings
+from react_agent.vectorstore import MatrixVectorStore
 
 # TODO: Explore whether modeling tool off of retrievers from
 # ref: https://github.com/langchain-ai/retrieval-agent-template/blob/main/src/retrieval_graph/retrieval.py
@@ -28,61 +40,452 @@ from react_agent.configuration import Configuration
 # As it is, poc here uses an inmemory vectorstore, so when moving to a service,
 # would appear to be very appropriate then
 
+class ScheduleQuery(TypedDict, total=False):
+    """A structured schedule question.
+
+    Any field left out is not used to narrow the search.
+    eg {"location": "Walter Baker", "day": "Monday"}
+    """
+
+    location: str
+    activity: str
+    day: str
+    question: str
+
+ScheduleQueryLike = Union[str, ScheduleQuery]
+
+FETCH_TIMEOUT_SECONDS = 30
+
+@dataclass
+class ScheduleSnapshot:
+    """Facility schedules fetched and indexed at a single point in time.
+
+    Every query answered by one snapshot sees the same data, and the pages
+    are fetched, turned into documents and indexed only once no matter how
+    many queries are asked of it. Snapshots are never modified; a refresh
+    derives a new one with `aapply_changes`.
+    """
+
+    pages: Sequence[dict]
+    retriever: HybridRetriever
+    fetched_at: datetime = field(default_factory=lambda: datetime.now(tz=timezone.utc))
+
+    @classmethod
+    def from_pages(
+        cls,
+        pages: list[dict],
+        embeddings: Optional[Embeddings] = None,
+        min_confidence: float = 0.5,
+    ) -> "ScheduleSnapshot":
+        """Index already parsed facility pages (see `_parse_page`)."""
+        documents = build_documents(pages)
+        retriever = HybridRetriever(documents, embeddings or load_embeddings(DEFAULT_EMBEDDING_MODEL), min_confidence)
+        return cls(pages=pages, retriever=retriever)
+
+    async def asearch(
+        self,
+        queries: Sequence[ScheduleQueryLike],
+        k: int = 4,
+        embeddings: Optional[Embeddings] = None,
+    ) -> dict[str, list[Document]]:
+        """Answer many queries against this snapshot.
+
+        Each query is narrowed by the location, activity and day it names
+        and ranked by keyword score; those that still need embeddings share a
+        single batch request.
+
+        Args:
+            queries (Sequence): Questions or structured queries.
+            k (int): Documents per query.
+            embeddings (Embeddings, optional): Makes any embedding requests
+                instead of the retriever's own, eg at a lower priority.
+
+        Returns:
+            dict: The retrieved documents keyed by `query_key` of each query.
+        """
+        keyed = {query_key(q): q for q in queries}
+        searches = [
+            (_query_text(q), self.retriever.filters_for(_query_text(q), _query_fields(q)))
+            for q in keyed.values()
+        ]
+        results = await self.retriever.abatch_search(searches, k=k, embeddings=embeddings)
+        return dict(zip(keyed, results))
+
+    async def aapply_changes(
+        self, pages: list[dict], changes: Sequence[RecordChange]
+    ) -> "ScheduleSnapshot":
+        """Derive the snapshot for `pages` from this one and their diff.
+
+        Only the documents of the (location, activity, day) groups touched
+        by a change are rebuilt and re-indexed.
+        """
+        affected = {
+            document_group(r) for c in changes for r in (c.record, c.previous) if r
+        }
+        removed = [
+            d.id for d in self.retriever.documents if d.id and document_group(d.metadata) in affected
+        ]
+        added = build_documents_from_records(
+            r for r in iter_records(pages) if document_group(r) in affected
+        )
+        return ScheduleSnapshot(pages=pages, retriever=await self.retriever.awith_changes(removed, added))
+
+    @classmethod
+    def from_bundle(
+        cls,
+        bundle: Bundle,
+        embeddings: Embeddings,
+        min_confidence: float = 0.5,
+        embedding_model: Optional[str] = None,
+    ) -> "ScheduleSnapshot":
+        """Use the documents and vectors precomputed by the ingestion job.
+
+        The bundle's vectors are only used when they were made with
+        `embedding_model`; otherwise they are recomputed if ever needed.
+        They are searched in place, without copying them out of the bundle.
+        """
+        vector_store = None
+        if bundle.embeddings is not None and bundle.manifest["embedding_model"] == embedding_model:
+            vector_store = MatrixVectorStore.from_matrix(embeddings, bundle.embeddings, bundle.documents)
+        retriever = HybridRetriever(
+            bundle.documents, embeddings, min_confidence, lexical=bundle.lexical, vector_store=vector_store
+        )
+        return cls(pages=bundle.pages, retriever=retriever)
+
+class ScheduleStore:
+    """Keeps the latest snapshot of a set of facilities and refreshes it.
+
+    A refresh diffs the newly parsed pages against the current ones and only
+    re-indexes what changed. With a `state_dir`, the last pages are saved
+    (so diffs carry across restarts) and every change is appended to
+    `changes.jsonl` in that directory.
+
+    With a `bundle_dir`, pages are never fetched here: the store serves the
+    bundle written by the ingestion job and a refresh only picks up a newer
+    version of it.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        embeddings: Embeddings,
+        min_confidence: float = 0.5,
+        max_age_seconds: float = 300,
+        state_dir: Optional[str] = None,
+        bundle_dir: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        """Prepare a store; nothing is fetched until first use."""
+        self.urls = list(urls)
+        self.embeddings = embeddings
+        self.min_confidence = min_confidence
+        self.max_age_seconds = max_age_seconds
+        self.state_dir = state_dir
+        self.bundle_dir = bundle_dir
+        self.embedding_model = embedding_model
+        self.bundle_version: Optional[str] = None
+        self.feed = ChangeFeed(os.path.join(state_dir, "changes.jsonl")) if state_dir else None
+        self.snapshot: Optional[ScheduleSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def load_bundle(self) -> list[RecordChange]:
+        """Switch to the bundle's current version if it is not already loaded.
+
+        Returns:
+            list: The record changes from the previously served pages. Empty
+            on a first load without a `state_dir`, where there is nothing to
+            compare against or record, so the pages are not decoded.
+        """
+        version = current_version(cast(str, self.bundle_dir))
+        if version is None or version == self.bundle_version:
+            if self.snapshot is not None:
+                self.snapshot = ScheduleSnapshot(self.snapshot.pages, self.snapshot.retriever)
+            return []
+        bundle = _preloaded.get(cast(str, self.bundle_dir))
+        if bundle is None or bundle.version != version:
+            bundle = load_bundle(cast(str, self.bundle_dir), version)
+        if self.snapshot is None and not self.state_dir:
+            changes = []
+        else:
+            previous = self.snapshot.pages if self.snapshot else self._load_pages()
+            changes = diff_pages(previous, bundle.pages)
+        self.snapshot = ScheduleSnapshot.from_bundle(
+            bundle, self.embeddings, self.min_confidence, self.embedding_model
+        )
+        self.bundle_version = version
+        self._record(bundle.pages, changes)
+        return changes
+
+    def is_stale(self) -> bool:
+        """Check whether the snapshot is missing or older than `max_age_seconds`."""
+        if self.snapshot is None:
+            return True
+        age = datetime.now(tz=timezone.utc) - self.snapshot.fetched_at
+        return age.total_seconds() >= self.max_age_seconds
+
+    async def aget(self) -> ScheduleSnapshot:
+        """Return the current snapshot, refreshing it first when stale."""
+        if self.is_stale():
+            await self.arefresh()
+        return cast(ScheduleSnapshot, self.snapshot)
+
+    async def arefresh(self) -> list[RecordChange]:
+        """Fetch every facility page again and apply what changed.
+
+        A page that fails to fetch keeps its previous contents rather than
+        being reported as removed.
+
+        Returns:
+            list: The record changes since the previous snapshot.
+        """
+        async with self._lock:
+            # another caller may have refreshed while we waited
+            if self.snapshot is not None and not self.is_stale():
+                return []
+            if self.bundle_dir and current_version(self.bundle_dir):
+                return await asyncio.to_thread(self.load_bundle)
+            previous = self.snapshot.pages if self.snapshot else self._load_pages()
+            previous_by_url = {p.get("url"): p for p in previous}
+            fetched = await asyncio.gather(
+                *(asyncio.to_thread(fetch_page, url) for url in self.urls),
+                return_exceptions=True,
+            )
+            pages = []
+            for url, page in zip(self.urls, fetched):
+                if isinstance(page, BaseException):
+                    if url not in previous_by_url:
+                        raise page
+                    page = previous_by_url[url]
+                pages.append(page)
+
+            changes = diff_pages(previous, pages)
+            if self.snapshot is None:
+                base = ScheduleSnapshot.from_pages(list(previous), self.embeddings, self.min_confidence)
+            else:
+                base = self.snapshot
+            if changes:
+                self.snapshot = await base.aapply_changes(pages, changes)
+            else:
+                self.snapshot = ScheduleSnapshot(pages, base.retriever)
+            self._record(pages, changes)
+            return changes
+
+    def _record(self, pages: Sequence[dict], changes: list[RecordChange]) -> None:
+        if changes:
+            self._save_pages(pages)
+            if self.feed:
+                self.feed.append(changes)
+
+    def _load_pages(self) -> list[dict]:
+        if not self.state_dir or not os.path.exists(os.path.join(self.state_dir, "pages.json")):
+            return []
+        with open(os.path.join(self.state_dir, "pages.json"), encoding="utf-8") as f:
+            return cast(list[dict], json.load(f))
+
+    def _save_pages(self, pages: Sequence[dict]) -> None:
+        if not self.state_dir:
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, "pages.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(list(pages), f)
+        os.replace(path + ".tmp", path)
+
+_stores: dict[tuple, ScheduleStore] = {}
+
+# bundle_dir -> the bundle `preload` read from it
+_preloaded: dict[str, Bundle] = {}
+
+def get_store(configuration: Configuration) -> ScheduleStore:
+    """Return the shared store for the configured facilities and embeddings."""
+    key = (
+        tuple(configuration.ott_rec_facility_urls),
+        configuration.embedding_model,
+        configuration.lexical_confidence_threshold,
+        configuration.schedule_state_dir,
+        configuration.schedule_bundle_dir,
+    )
+    if key not in _stores:
+        if configuration.embedding_model.startswith("local/"):
+            embeddings = load_embeddings(configuration.embedding_model)
+        else:
+            # the governor retries rate limited requests, not the client
+            embeddings = GovernedEmbeddings(
+                load_embeddings(configuration.embedding_model, max_retries=0), get_governor(configuration)
+            )
+        _stores[key] = ScheduleStore(
+            configuration.ott_rec_facility_urls,
+            embeddings,
+            min_confidence=configuration.lexical_confidence_threshold,
+            state_dir=configuration.schedule_state_dir or None,
+            bundle_dir=configuration.schedule_bundle_dir or None,
+            embedding_model=configuration.embedding_model,
+        )
+    _stores[key].max_age_seconds = configuration.schedule_max_age_seconds
+    return _stores[key]
+
+def store_stats() -> dict[str, int]:
+    """Measure the shared stores, their indexes and the fetched page cache.
+
+    Returns:
+        dict: The number of stores, the documents, keyword index terms and
+        embedding bytes (see `MatrixVectorStore.nbytes`) of their snapshots,
+        and the number of cached pages.
+    """
+    stats = {"stores": len(_stores), "documents": 0, "lexical_terms": 0, "vector_bytes": 0}
+    for store in _stores.values():
+        if store.snapshot is None:
+            continue
+        retriever = store.snapshot.retriever
+        stats["documents"] += len(retriever.documents)
+        stats["lexical_terms"] += retriever.lexical.vocabulary_size
+        if retriever.vector_store is not None:
+            stats["vector_bytes"] += retriever.vector_store.nbytes
+    stats["cached_pages"] = len(_page_cache)
+    return stats
+
+def preload(configuration: Configuration) -> Optional[str]:
+    """Load the configured schedule bundle, if there is one, ahead of any query.
+
+    Only the bundle is read; no store or embedding model is created, so the
+    store for whichever embedding model the first query is configured with
+    starts from it without reading it again.
+
+    Returns:
+        str: The loaded bundle version, or None when no bundle is configured
+        or none has been written yet.
+    """
+    bundle_dir = configuration.schedule_bundle_dir
+    version = current_version(bundle_dir) if bundle_dir else None
+    if version is None:
+        return None
+    _preloaded[bundle_dir] = load_bundle(bundle_dir, version)
+    return version
+
+async def aload_snapshot(
+    urls: Sequence[str],
+    embeddings: Optional[Embeddings] = None,
+    min_confidence: float = 0.5,
+) -> ScheduleSnapshot:
+    """Fetch and parse every facility page concurrently, then index them."""
+    pages = await asyncio.gather(*(asyncio.to_thread(fetch_page, url) for url in urls))
+    return ScheduleSnapshot.from_pages(list(pages), embeddings, min_confidence)
+
+async def asearch_schedules(
+    queries: Sequence[ScheduleQueryLike], configuration: Configuration
+) -> dict[str, list[Document]]:
+    """Resolve a batch of schedule queries against one consistent snapshot.
+
+    The snapshot is shared between calls and refreshed once it is older
+    than `schedule_max_age_seconds`. This is the Python entry point behind
+    `get_schedule_times_batch`.
+    """
+    snapshot = await get_store(configuration).aget()
+    return await snapshot.asearch(queries)
+
+def query_key(query: ScheduleQueryLike) -> str:
+    """Return the key a query's results are reported under.
+
+    Free text queries are their own key; structured queries are keyed by
+    their question followed by their filled in fields, so the same question
+    asked of different facilities gets a key per facility.
+    eg "when is swim? | location=Minto"
+    """
+    if isinstance(query, str):
+        return query
+    parts = [query["question"]] if query.get("question") else []
+    parts.extend(f"{k}={v}" for k, v in _query_fields(query).items())
+    return " | ".join(parts)
+
+def _query_text(query: ScheduleQueryLike) -> str:
+    if isinstance(query, str):
+        return query
+    parts = [query.get("question"), query.get("activity"), query.get("location"), query.get("day")]
+    return " ".join(p for p in parts if p)
+
+def _query_fields(query: ScheduleQueryLike) -> Filters:
+    if isinstance(query, str):
+        return {}
+    return {k: query[k] for k in ("location", "activity", "day") if query.get(k)}
+
 @tool
 async def get_preschool_swim_times(
     query: str, *, config: Annotated[RunnableConfig, InjectedToolArg]
-) -> Optional[list[dict[str, Any]]]:
+) -> str:
     """Get preschool swim times.
 
     This function accesses websites for Recreation Centers and returns
-    time slots for activities for a particular day.
+    time slots for activities for a particular day. Results are grouped
+    under "location | activity" headers with one "Day: times (date range)"
+    line each, most relevant first.
     """
     configuration = Configuration.from_runnable_config(config)
     # TODO: implement PreschoolSwimResults(urls=configuration.ott_rec_facility_urls, max_results=configuration.max_search_results)
     # wrapped = TavilySearchResults(max_results=configuration.max_search_results)
 
-    data = []
-    for url in configuration.ott_rec_facility_urls:
-        # fetch webpage
-        resp = requests.get(url)
-        # parse html for activities
-        soup = BeautifulSoup(resp.text, "html.parser")
-        location_activities = _parse_page(soup, resp.url)
-        # save
-        data.append(location_activities)
-
-    docs = []
-    for d in data:
-        docs.append(Document(
-            page_content=str(d["time_blocks"]),
-            metadata={
-                "location": d["location"],
-            }
-        ))
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=20)
-    documents = splitter.split_documents(docs)
-
-    embeddings = OpenAIEmbeddings()
-    vector_store = InMemoryVectorStore(embeddings)
-    _ = vector_store.add_documents(documents=documents)
-
-    # TODO: Explore Metadata filtering
-    # ref: https://python.langchain.com/docs/concepts/vectorstores/#metadata-filtering
-    retrieved_docs = vector_store.similarity_search(query)
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
-
-    # TODO: Customize prompt
-    # ref (OLD VERSION DOC): https://python.langchain.com/v0.1/docs/use_cases/question_answering/quickstart/#customizing-the-prompt
-    prompt = hub.pull("rlm/rag-prompt")
-    result = await prompt.ainvoke({"question": query, "context": docs_content})
-    return cast(list[dict[str, Any]], result)
+    retrieved = await asearch_schedules([query], configuration)
+    # The model answers from the compact rows directly; a RAG prompt template
+    # (eg hub.pull("rlm/rag-prompt")) would only repeat instructions it
+    # already has in every later step of the conversation
+    return encode_schedule(retrieved[query], configuration.max_tool_result_tokens)
+
+@tool
+async def get_schedule_times_batch(
+    queries: list[ScheduleQueryLike], *, config: Annotated[RunnableConfig, InjectedToolArg]
+) -> str:
+    """Get preschool swim times for several questions at once.
+
+    Prefer this over repeated get_preschool_swim_times calls when asking
+    about more than one facility or day. Each query is either free text or
+    an object with any of location, activity, day and question. Returns a
+    "# query" section per query, formatted as get_preschool_swim_times does;
+    when there are too many queries to answer within the result size, the
+    last ones are left out and should be asked again separately.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    retrieved = await asearch_schedules(queries, configuration)
+    return encode_batch(retrieved, configuration.max_tool_result_tokens)
+
+def parse_html(html: str, url: str) -> dict:
+    """Parse a facility page's html into its location, time blocks and schedule changes."""
+    return _parse_page(BeautifulSoup(html, "html.parser"), url)
+
+# url -> (ETag, parsed page) of the last successful fetch
+_page_cache: dict[str, tuple[str, dict]] = {}
+
+def fetch_page(url: str) -> dict:
+    """Fetch and parse a facility page (see `parse_html`).
+
+    Pages are cached by ETag, so a page that has not changed since it was
+    last fetched is not downloaded or parsed again.
+
+    Raises:
+        requests.HTTPError: When the page could not be fetched.
+    """
+    cached = _page_cache.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT_SECONDS)
+    if resp.status_code == 304 and cached:
+        METRICS.incr("fetch.not_modified")
+        return cached[1]
+    resp.raise_for_status()
+    # parse html for activities
+    page = parse_html(resp.text, resp.url)
+    METRICS.incr("fetch.parsed")
+    if resp.headers.get("ETag"):
+        _page_cache[url] = (resp.headers["ETag"], page)
+    return page
+
+# eg "March 17 to April 6 The pool is closed" or "April 18: Closed for Good Friday"
+SCHEDULE_CHANGE_PATTERN = re.compile(
+    r"^(?P<start>[A-Z][a-z]+ \d{1,2})(?: to (?P<end>[A-Z][a-z]+ \d{1,2}))?[:,-]?\s*(?P<description>.*)$"
+)
 
 def _parse_page(page: BeautifulSoup, url: str) -> dict:
     location = page.find("h1").text.strip()
-    # TODO: Handle Schedule Changes section
+    # Schedule Changes section is parsed into schedule_changes (see _parse_schedule_changes)
     # (eg Minto March 17 to April 6 The pool is closed for annual maintenance.)
-    # How stitch into existing data structure? Or need to adjust for type of query...
+    # TODO: How stitch into existing data structure? Or need to adjust for type of query...
     # ie give ai entry points to do either an activity query or a date query
     # - "What are available activities at location X for date Y?"
     # - "What are times for activity X at location Y?"
@@ -91,9 +494,9 @@ def _parse_page(page: BeautifulSoup, url: str) -> dict:
     time_blocks = []
     for table in page.find_all("table"):
         # determine category (eg Swim) and time blocks (eg March 11 to May 2)
-        parsedCaption = _parse_table_caption(table.find("caption"))
+        parsedCaption = _parse_table_caption(table.find("caption")) if table.find("caption") else {}
 
-        if "swim" in parsedCaption.get("category").lower():
+        if "swim" in (parsedCaption.get("category") or "").lower():
             # establish days of the week as defined by table columns
             days = _parse_table_columns(table.find("thead"))
 
@@ -108,7 +511,33 @@ def _parse_page(page: BeautifulSoup, url: str) -> dict:
                 "activities": activities,
             })
 
-    return { "location": location, "time_blocks": time_blocks, "url": url }
+    return {
+        "location": location,
+        "time_blocks": time_blocks,
+        "schedule_changes": _parse_schedule_changes(page),
+        "url": url,
+    }
+
+def _parse_schedule_changes(page: BeautifulSoup) -> list:
+    # eg <h2>Schedule changes</h2><p>March 17 to April 6 The pool is closed for annual maintenance.</p>
+    heading = page.find(
+        lambda tag: tag.name in ("h2", "h3", "h4") and "schedule changes" in _clean(tag.text).lower()
+    )
+    if heading is None:
+        return []
+    schedule_changes = []
+    for sibling in heading.find_next_siblings():
+        if sibling.name in ("h1", "h2", "h3", "h4"):
+            break
+        for item in sibling.find_all(["p", "li"]) or [sibling]:
+            match = SCHEDULE_CHANGE_PATTERN.match(_clean(item.get_text(" ")))
+            if match:
+                schedule_changes.append({
+                    "start": match.group("start"),
+                    "end": match.group("end") or match.group("start"),
+                    "description": match.group("description"),
+                })
+    return schedule_changes
 
 def _parse_table_caption(caption: BeautifulSoup) -> dict:
     splitted_caption = _clean(caption.text).split(" - ")
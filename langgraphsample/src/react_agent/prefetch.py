@@ -0,0 +1,127 @@
+"""Speculative schedule prefetching.
+
+When the latest user message looks like a schedule question, the facility
+snapshot and its retrieval index are warmed while the first model call is
+still deciding whether to use a schedule tool, so the tool finds its data
+ready instead of adding the fetch to the model's latency. When the model
+answers without a schedule tool, the prefetch is cancelled.
+
+Any embedding the prefetch needs is requested at `governor.BACKGROUND`
+priority, so a guess never delays interactive requests; a tool call that
+needs the vector index while the prefetch is still building it builds it
+at interactive priority rather than waiting (see
+`HybridRetriever.aindex_vectors`). The question's
+vector is kept by the snapshot's retriever, and reused when the tool asks
+the same question.
+
+Outcomes are counted in `diagnostics.METRICS`:
+
+- prefetch.started: a prefetch was started
+- prefetch.hit: the model went on to call a schedule tool
+- prefetch.mispredicted: it did not, and the prefetch was cancelled
+- prefetch.missed: a schedule tool was called without a prefetch
+"""
+
+import asyncio
+import logging
+import re
+from typing import Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+
+from react_agent import ottawarec
+from react_agent.configuration import Configuration
+from react_agent.diagnostics import METRICS
+from react_agent.governor import BACKGROUND, GovernedEmbeddings
+from react_agent.utils import get_message_text
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_TOOLS = {
+    ottawarec.get_preschool_swim_times.name,
+    ottawarec.get_schedule_times_batch.name,
+}
+
+_SCHEDULE_WORDS = re.compile(
+    r"\b(swim\w*|pools?|aquafit|preschool|schedules?|timetable|lessons?|drop[- ]?in|"
+    r"recreation|rec centre|sports centre|walter baker|minto|barrhaven)\b",
+    re.IGNORECASE,
+)
+
+# Keeps running prefetches from being garbage collected before they finish
+_tasks: set[asyncio.Task] = set()
+
+
+def looks_like_schedule_query(text: str) -> bool:
+    """Cheaply guess whether a message asks about facility schedules."""
+    return bool(_SCHEDULE_WORDS.search(text))
+
+
+def running() -> int:
+    """Count the prefetches that have not finished yet."""
+    return len(_tasks)
+
+
+def start_prefetch(
+    messages: Sequence[AnyMessage], configuration: Configuration
+) -> Optional[asyncio.Task]:
+    """Start warming the schedule snapshot if the user's turn looks like it needs it.
+
+    Only the first model call of a turn (the latest message is from the
+    user) is considered.
+
+    Returns:
+        asyncio.Task: The running prefetch, or None when none was started.
+    """
+    if not configuration.schedule_prefetch or not messages:
+        return None
+    last = messages[-1]
+    if not isinstance(last, HumanMessage):
+        return None
+    text = get_message_text(last)
+    if not looks_like_schedule_query(text):
+        return None
+    task = asyncio.create_task(_prefetch(text, configuration))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    METRICS.incr("prefetch.started")
+    return task
+
+
+def settle_prefetch(task: Optional[asyncio.Task], response: Optional[AIMessage]) -> None:
+    """Keep or cancel a prefetch once the model has decided what to do.
+
+    Args:
+        task (asyncio.Task, optional): From `start_prefetch`.
+        response (AIMessage, optional): The model's response, or None if the
+            call failed.
+    """
+    wanted = response is not None and any(
+        call["name"] in SCHEDULE_TOOLS for call in response.tool_calls
+    )
+    if task is None:
+        if wanted:
+            METRICS.incr("prefetch.missed")
+        return
+    if wanted:
+        METRICS.incr("prefetch.hit")
+    else:
+        METRICS.incr("prefetch.mispredicted")
+        task.cancel()
+
+
+async def _prefetch(text: str, configuration: Configuration) -> None:
+    try:
+        store = ottawarec.get_store(configuration)
+        embeddings = store.embeddings
+        if isinstance(embeddings, GovernedEmbeddings):
+            embeddings = embeddings.with_priority(BACKGROUND)
+        snapshot = await store.aget()
+        # runs the lexical pass, and builds the vector index and embeds the
+        # question if it would need the embedding fallback
+        await snapshot.asearch([text], embeddings=embeddings)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # the tool will retry and report the problem if it calls
+        logger.warning("Schedule prefetch failed", exc_info=True)
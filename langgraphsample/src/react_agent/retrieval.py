@@ -0,0 +1,421 @@
+"""Hybrid retrieval over facility schedule documents.
+
+Schedule questions are usually precise ("preschool swim at Minto on Friday"),
+so most can be answered by narrowing on metadata and keyword scoring alone.
+Embeddings are only requested, and the vector index only built, for queries
+the lexical pass is not confident about.
+"""
+
+import asyncio
+import math
+import re
+from collections import Counter
+from typing import Optional, Protocol, Sequence, runtime_checkable
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from react_agent.vectorstore import MatrixVectorStore
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+QUERY_CACHE_SIZE = 256
+"""Query vectors each retriever keeps for reuse."""
+
+# Words too common across facility names to identify one (eg "Centre")
+_LOCATION_STOP_WORDS = {"sports", "centre", "center", "recreation", "complex", "community", "arena", "pool", "the", "and", "of"}
+_STOP_WORDS = {"a", "an", "and", "are", "at", "for", "in", "is", "of", "on", "the", "to", "what", "when", "where", "which"}
+
+Filters = dict[str, str]
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase keyword tokens."""
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in _STOP_WORDS]
+
+
+def extract_filters(
+    text: str, locations: Sequence[str], activities: Sequence[str]
+) -> Filters:
+    """Find the location, activity and weekday a free text query mentions.
+
+    Args:
+        text (str): The query.
+        locations (Sequence[str]): Location names known to the index.
+        activities (Sequence[str]): Activity names known to the index.
+
+    Returns:
+        dict: Lowercase metadata values keyed by metadata field. Fields the
+        query does not clearly mention are left out.
+    """
+    words = set(re.findall(r"[a-z0-9]+", text.lower()))
+    lowered = text.lower()
+    filters: Filters = {}
+
+    matched_locations = [
+        loc for loc in locations
+        if words & (set(re.findall(r"[a-z0-9]+", loc.lower())) - _LOCATION_STOP_WORDS)
+    ]
+    if len(matched_locations) == 1:
+        filters["location"] = matched_locations[0].lower()
+
+    # prefer the most specific activity (eg "Preschool swim" over "swim")
+    matched_activities = sorted(
+        (a for a in activities if a.lower() in lowered), key=len, reverse=True
+    )
+    if matched_activities:
+        filters["activity"] = matched_activities[0].lower()
+
+    matched_days = [d for d in WEEKDAYS if d.lower() in words]
+    if len(matched_days) == 1:
+        filters["day"] = matched_days[0].lower()
+
+    return filters
+
+
+def matches_filters(doc: Document, filters: Filters) -> bool:
+    """Check a document against metadata filters.
+
+    Filters only apply to metadata the document actually carries, and match
+    on a case insensitive substring so "minto" finds "Minto Recreation Complex".
+    """
+    return all(
+        v in str(doc.metadata[k]).lower()
+        for k, v in filters.items() if k in doc.metadata
+    )
+
+
+@runtime_checkable
+class IndexedDocuments(Protocol):
+    """Documents that can be filtered without decoding each one.
+
+    eg `snapshotfile.MappedDocuments`, which filters a memory mapped
+    snapshot's records.
+    """
+
+    def __len__(self) -> int:
+        """Return the number of documents."""
+        ...
+
+    def __getitem__(self, n: int) -> Document:
+        """Return document number `n`."""
+        ...
+
+    def values(self, field: str) -> list[str]:
+        """Return the distinct values of a metadata field, sorted."""
+        ...
+
+    def matching(self, filters: Filters) -> list[int]:
+        """Return the positions of the documents matching the filters."""
+        ...
+
+
+class KeywordIndex(Protocol):
+    """What `HybridRetriever` needs of a keyword index, eg `BM25Index`."""
+
+    @property
+    def vocabulary_size(self) -> int:
+        """Number of distinct terms in the index."""
+        ...
+
+    def score(self, query: str, candidates: Sequence[int]) -> list[tuple[int, float]]:
+        """Score candidate documents, best first."""
+        ...
+
+    def with_changes(self, keep: Sequence[int], texts: Sequence[str]) -> "BM25Index":
+        """Return a new index of the kept positions followed by new texts."""
+        ...
+
+
+class BM25Index:
+    """A small in-memory Okapi BM25 keyword index."""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        """Index the given texts; results refer to them by position."""
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(t)) for t in texts]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.doc_freqs: Counter[str] = Counter()
+        for tf in self.term_freqs:
+            self.doc_freqs.update(tf.keys())
+        self._update_stats()
+
+    @property
+    def vocabulary_size(self) -> int:
+        """Number of distinct terms in the index."""
+        return len(self.doc_freqs)
+
+    def with_changes(self, keep: Sequence[int], texts: Sequence[str]) -> "BM25Index":
+        """Return a new index of the kept positions followed by new texts.
+
+        Only the new texts are tokenized; this index is left unchanged.
+        """
+        index = BM25Index([], self.k1, self.b)
+        kept = set(keep)
+        index.doc_freqs = self.doc_freqs.copy()
+        for i, tf in enumerate(self.term_freqs):
+            if i not in kept:
+                index.doc_freqs.subtract(tf.keys())
+        added = [Counter(tokenize(t)) for t in texts]
+        for tf in added:
+            index.doc_freqs.update(tf.keys())
+        index.doc_freqs = +index.doc_freqs  # drop terms no longer present
+        index.term_freqs = [self.term_freqs[i] for i in keep] + added
+        index.lengths = [self.lengths[i] for i in keep] + [sum(tf.values()) for tf in added]
+        index._update_stats()
+        return index
+
+    def _update_stats(self) -> None:
+        n = len(self.term_freqs)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            t: math.log(1 + (n - df + 0.5) / (df + 0.5)) for t, df in self.doc_freqs.items()
+        }
+
+    def score(self, query: str, candidates: Sequence[int]) -> list[tuple[int, float]]:
+        """Score candidate documents, best first.
+
+        Returns:
+            list: (position, confidence) pairs where confidence is the BM25
+            score normalised by that of an average length document containing
+            each of the query's known terms once, capped at 1.0.
+        """
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms:
+            return [(i, 0.0) for i in candidates]
+        ceiling = sum(self.idf[t] for t in terms)
+        scored = []
+        for i in candidates:
+            tf, length = self.term_freqs[i], self.lengths[i]
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            s = sum(
+                self.idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm)
+                for t in terms if t in tf
+            )
+            scored.append((i, min(s / ceiling, 1.0)))
+        return sorted(scored, key=lambda p: p[1], reverse=True)
+
+
+class HybridRetriever:
+    """Metadata pre-filtering and BM25 scoring, with an embedding fallback.
+
+    The vector store is built from the same documents the first time a query
+    needs it, so a snapshot that is only ever queried lexically never pays
+    for embedding its documents. It is built with the async embedding API,
+    so building it never blocks the event loop. The most recent query
+    vectors are kept too, so a query embedded ahead of time (see
+    `prefetch`) is not embedded again.
+    """
+
+    def __init__(
+        self,
+        documents: Sequence[Document],
+        embeddings: Embeddings,
+        min_confidence: float = 0.5,
+        *,
+        lexical: Optional[KeywordIndex] = None,
+        vector_store: Optional[MatrixVectorStore] = None,
+    ):
+        """Index the documents for keyword search.
+
+        Args:
+            documents (Sequence[Document]): Schedule documents with metadata;
+                `IndexedDocuments` are filtered in place, anything else is
+                copied into a list.
+            embeddings (Embeddings): Used only when falling back to vectors.
+            min_confidence (float): Lexical confidence below which a query
+                falls back to embedding similarity.
+            lexical (KeywordIndex, optional): A prebuilt keyword index over
+                the documents, in the same order.
+            vector_store (MatrixVectorStore, optional): A prebuilt vector
+                index over the documents, in the same order.
+        """
+        self.documents: Sequence[Document] = (
+            documents if isinstance(documents, IndexedDocuments) else list(documents)
+        )
+        self.embeddings = embeddings
+        self.min_confidence = min_confidence
+        self.lexical: KeywordIndex = lexical or BM25Index([d.page_content for d in self.documents])
+        if isinstance(self.documents, IndexedDocuments):
+            self.locations = self.documents.values("location")
+            self.activities = self.documents.values("activity")
+        else:
+            self.locations = sorted({str(d.metadata["location"]) for d in self.documents if "location" in d.metadata})
+            self.activities = sorted({str(d.metadata["activity"]) for d in self.documents if "activity" in d.metadata})
+        self._vector_store = vector_store
+        self._index_build: Optional[asyncio.Task] = None
+        self._index_build_deferrable = False
+        self._query_vectors: dict[str, np.ndarray] = {}
+
+    @property
+    def vector_store(self) -> Optional[MatrixVectorStore]:
+        """The embedding index over the documents, or None until it is built.
+
+        Rows are in the same order as `documents`.
+        """
+        return self._vector_store
+
+    async def aindex_vectors(self, embeddings: Optional[Embeddings] = None) -> MatrixVectorStore:
+        """Return the embedding index, building it first if needed.
+
+        Concurrent callers share a single build, except that a build made
+        with other `embeddings` (a prefetch's, at a lower priority) is
+        abandoned for a new one with the retriever's own as soon as a caller
+        without them needs the index, so that caller never waits behind
+        lower priority work.
+
+        Args:
+            embeddings (Embeddings, optional): Embeds the documents instead
+                of `embeddings`, eg at a lower priority.
+        """
+        while self._vector_store is None:
+            build = self._index_build
+            if build is None or (self._index_build_deferrable and embeddings is None):
+                if build is not None:
+                    build.cancel()
+                build = asyncio.ensure_future(self._abuild_index(embeddings))
+                build.add_done_callback(self._index_build_done)
+                self._index_build = build
+                self._index_build_deferrable = embeddings is not None
+            try:
+                # one caller giving up must not cancel the build for the others
+                await asyncio.shield(build)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not build.cancelled() or (task is not None and task.cancelling()):
+                    raise
+                # superseded by a build for a caller that cannot wait
+        return self._vector_store
+
+    async def _abuild_index(self, embeddings: Optional[Embeddings]) -> None:
+        store = MatrixVectorStore(self.embeddings)
+        if self.documents:
+            vectors = await (embeddings or self.embeddings).aembed_documents(
+                [d.page_content for d in self.documents]
+            )
+            store.add_vectors(np.asarray(vectors, dtype=np.float32), self.documents)
+        self._vector_store = store
+
+    def _index_build_done(self, build: asyncio.Task) -> None:
+        # a failed build is retried by the next caller
+        if self._index_build is build and (build.cancelled() or build.exception() is not None):
+            self._index_build = None
+
+    async def aembed_queries(
+        self, texts: Sequence[str], embeddings: Optional[Embeddings] = None
+    ) -> np.ndarray:
+        """Embed query texts in one request, reusing recently embedded ones.
+
+        Args:
+            texts (Sequence[str]): Queries to embed.
+            embeddings (Embeddings, optional): Embeds the queries instead of
+                `embeddings`, eg at a lower priority.
+
+        Returns:
+            np.ndarray: (len(texts), dimensions) float32 vectors.
+        """
+        missing = [t for t in dict.fromkeys(texts) if t not in self._query_vectors]
+        if missing:
+            vectors = await (embeddings or self.embeddings).aembed_documents(missing)
+            self._query_vectors.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+            for text in list(self._query_vectors)[: max(0, len(self._query_vectors) - QUERY_CACHE_SIZE)]:
+                del self._query_vectors[text]
+        return np.stack([self._query_vectors[t] for t in texts])
+
+    async def awith_changes(
+        self, removed_ids: Sequence[str], added: Sequence[Document]
+    ) -> "HybridRetriever":
+        """Return a new retriever with some documents removed and others added.
+
+        Only the added documents are tokenized, and embedded if the vector
+        index has been built; everything else is carried over. This
+        retriever is left unchanged for any searches still using it.
+        """
+        removed = set(removed_ids)
+        keep = [i for i, d in enumerate(self.documents) if d.id not in removed]
+        vector_store = None
+        if self._vector_store is not None:
+            vector_store = self._vector_store.subset(keep)
+            if added:
+                vectors = await self.embeddings.aembed_documents([d.page_content for d in added])
+                vector_store.add_vectors(np.asarray(vectors, dtype=np.float32), added)
+        return HybridRetriever(
+            [self.documents[i] for i in keep] + list(added),
+            self.embeddings,
+            self.min_confidence,
+            lexical=self.lexical.with_changes(keep, [d.page_content for d in added]),
+            vector_store=vector_store,
+        )
+
+    def filters_for(self, text: str, explicit: Optional[Filters] = None) -> Filters:
+        """Combine filters extracted from the text with explicitly given ones."""
+        filters = extract_filters(text, self.locations, self.activities)
+        filters.update({k: v.lower() for k, v in (explicit or {}).items() if v})
+        return filters
+
+    def lexical_search(
+        self, text: str, filters: Filters, k: int = 4
+    ) -> tuple[list[Document], bool]:
+        """Rank documents matching the filters by keyword score.
+
+        Returns:
+            tuple: The top k documents and whether the ranking is confident
+            enough to skip the embedding fallback. When the filters alone
+            narrow the candidates to k or fewer, they are the answer.
+        """
+        candidates = self._candidates(filters)
+        if not candidates:
+            return [], True
+        if filters and len(candidates) <= k:
+            return [self.documents[i] for i in candidates], True
+        scored = self.lexical.score(text, candidates)
+        confident = scored[0][1] >= self.min_confidence
+        return [self.documents[i] for i, s in scored[:k] if s > 0], confident
+
+    async def abatch_search(
+        self,
+        requests: Sequence[tuple[str, Filters]],
+        k: int = 4,
+        embeddings: Optional[Embeddings] = None,
+    ) -> list[list[Document]]:
+        """Search for many (text, filters) pairs.
+
+        Queries the lexical pass is unsure about are embedded together in one
+        request (see `aembed_queries`) and answered by vector similarity
+        within their filters. Filters reuse the lexical candidates, so the
+        vector search only scores the rows that could match.
+
+        Args:
+            requests (Sequence[tuple[str, Filters]]): Texts and their filters.
+            k (int): Documents per request.
+            embeddings (Embeddings, optional): Makes any embedding requests
+                instead of `embeddings`, eg at a lower priority.
+        """
+        results: list[list[Document]] = []
+        fallback: dict[str, list[int]] = {}
+        for n, (text, filters) in enumerate(requests):
+            docs, confident = self.lexical_search(text, filters, k)
+            results.append(docs)
+            if not confident:
+                fallback.setdefault(text, []).append(n)
+
+        if fallback:
+            vector_store = await self.aindex_vectors(embeddings)
+            texts = list(fallback)
+            vectors = await self.aembed_queries(texts, embeddings)
+            for text, vector in zip(texts, vectors):
+                for n in fallback[text]:
+                    filters = requests[n][1]
+                    candidates = np.asarray(self._candidates(filters), dtype=np.intp) if filters else None
+                    (top,) = vector_store.top_k(vector[None, :], k, candidates)
+                    results[n] = [self.documents[i] for i in top]
+        return results
+
+    def _candidates(self, filters: Filters) -> list[int]:
+        if not filters:
+            return list(range(len(self.documents)))
+        if isinstance(self.documents, IndexedDocuments):
+            return self.documents.matching(filters)
+        return [i for i, d in enumerate(self.documents) if matches_filters(d, filters)]
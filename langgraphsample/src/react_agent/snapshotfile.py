@@ -0,0 +1,431 @@
+"""A binary schedule snapshot file that is read through mmap.
+
+When the server runs several worker processes, each would otherwise hold its
+own copy of the parsed schedules, their keyword index and their embedding
+matrix. A snapshot file lays them out so they can be used straight from a
+shared memory map: every worker maps the same file, the operating system
+keeps one copy of it in the page cache, and the arrays are NumPy views onto
+the mapping rather than copies.
+
+The layout (little endian, sections aligned to 64 bytes) is
+
+    header          magic, format version, counts and section offsets
+    string offsets  uint64[strings + 1], byte offsets into the string data
+    string data     utf-8; strings 0 to pages - 1 are the pages as JSON
+    records         uint32[documents, columns], string numbers per `COLUMNS`
+    embeddings      float32[documents, dimensions], absent when dimensions is 0
+    terms           uint32[terms], string numbers of the keyword terms, sorted
+    postings        uint64[terms + 1], offsets into the posting sections
+    posting docs    uint32[postings], the documents containing each term
+    posting counts  uint32[postings], how often the term occurs in each
+    lengths         uint32[documents], terms per document
+
+Repeated values such as locations and activities are stored once in the
+string table. Nothing is parsed when a file is opened: documents and pages
+are decoded one at a time when asked for, and `MappedDocuments` and
+`MappedBM25Index` filter and keyword-score the documents from the mapping.
+Files are written to a temporary name and renamed into place, so a reader
+sees either the old file or the new one, and a worker that already mapped
+the old file keeps reading it until it opens the new one.
+"""
+
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+from collections import Counter
+from typing import Optional, Sequence, overload
+
+import numpy as np
+from langchain.schema import Document
+
+from react_agent.retrieval import BM25Index, Filters, matches_filters, tokenize
+
+MAGIC = b"ORECSNAP"
+FORMAT_VERSION = 2
+
+METADATA_FIELDS = ("location", "activity", "day", "time_slots", "category", "url")
+COLUMNS = ("id", "page_content", *METADATA_FIELDS, "extra_metadata")
+"""Record columns; `extra_metadata` holds any other metadata as JSON."""
+
+# string numbers standing for a None value and an absent metadata key
+NONE = 0xFFFFFFFF
+MISSING = 0xFFFFFFFE
+
+_HEADER = struct.Struct("<8sIIIIIII9Q")
+_ALIGN = 64
+
+
+class MappedSnapshot:
+    """A snapshot file opened read only through mmap.
+
+    `records`, `embeddings` and the keyword index arrays are views onto the
+    mapping, so opening a file reads nothing until the data is used, and
+    processes mapping the same file share its memory.
+    """
+
+    def __init__(self, path: str):
+        """Map a snapshot file.
+
+        Raises:
+            ValueError: When the file is not a snapshot or was written in an
+                unknown format.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path} is not a schedule snapshot")
+        magic, version, documents, columns, dimensions, strings, pages, terms, *offsets = (
+            _HEADER.unpack_from(self._mmap)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a schedule snapshot")
+        if version != FORMAT_VERSION or columns != len(COLUMNS):
+            raise ValueError(f"Unsupported schedule snapshot format {version} in {path}")
+        (
+            string_offsets, self._string_data, records, embeddings,
+            term_strings, postings, posting_docs, posting_counts, lengths,
+        ) = offsets
+        self._pages = pages
+        self._string_offsets = self._array("<u8", strings + 1, string_offsets)
+        self.records = self._array("<u4", documents * columns, records).reshape(documents, columns)
+        """(documents, columns) string numbers, one row per document."""
+        self.embeddings: Optional[np.ndarray] = None
+        """(documents, dimensions) float32 view, or None when written without embeddings."""
+        if dimensions:
+            self.embeddings = self._array("<f4", documents * dimensions, embeddings).reshape(documents, dimensions)
+        self.terms = self._array("<u4", terms, term_strings)
+        """String numbers of the keyword index's terms, in sorted order."""
+        self.postings = self._array("<u8", terms + 1, postings)
+        """Offsets of each term's entries in `posting_docs` and `posting_counts`."""
+        count = int(self.postings[-1])
+        self.posting_docs = self._array("<u4", count, posting_docs)
+        self.posting_counts = self._array("<u4", count, posting_counts)
+        self.lengths = self._array("<u4", documents, lengths)
+        """Keyword terms in each document."""
+
+    def __len__(self) -> int:
+        """Return the number of documents."""
+        return len(self.records)
+
+    def string(self, n: int) -> str:
+        """Return string number `n` from the string table."""
+        start = self._string_data + int(self._string_offsets[n])
+        end = self._string_data + int(self._string_offsets[n + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    @property
+    def pages(self) -> "MappedPages":
+        """The parsed pages the documents were built from."""
+        return MappedPages(self, self._pages)
+
+    def document(self, n: int) -> Document:
+        """Return document number `n`."""
+        row = [int(s) for s in self.records[n]]
+        values = dict(zip(COLUMNS, row))
+        metadata = {
+            name: None if values[name] == NONE else self.string(values[name])
+            for name in METADATA_FIELDS
+            if values[name] != MISSING
+        }
+        if values["extra_metadata"] != NONE:
+            metadata.update(json.loads(self.string(values["extra_metadata"])))
+        return Document(
+            id=self.string(values["id"]),
+            page_content=self.string(values["page_content"]),
+            metadata=metadata,
+        )
+
+    def documents(self) -> "MappedDocuments":
+        """Return the documents, in row order, decoded as they are used."""
+        return MappedDocuments(self)
+
+    @property
+    def lexical(self) -> "MappedBM25Index":
+        """The documents' keyword index."""
+        return MappedBM25Index(self)
+
+    def _array(self, dtype: str, count: int, offset: int) -> np.ndarray:
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+
+
+class MappedPages(Sequence[dict]):
+    """The pages of a snapshot, each parsed when it is used."""
+
+    def __init__(self, snapshot: MappedSnapshot, count: int):
+        """Read pages from the first `count` strings of the snapshot."""
+        self._snapshot = snapshot
+        self._count = count
+
+    def __len__(self) -> int:
+        """Return the number of pages."""
+        return self._count
+
+    @overload
+    def __getitem__(self, n: int) -> dict: ...
+
+    @overload
+    def __getitem__(self, n: slice) -> list[dict]: ...
+
+    def __getitem__(self, n: int | slice) -> dict | list[dict]:
+        """Parse page number `n` (or a slice of them)."""
+        if isinstance(n, slice):
+            return [self[i] for i in range(self._count)[n]]
+        return json.loads(self._snapshot.string(range(self._count)[n]))
+
+
+class MappedDocuments(Sequence[Document]):
+    """The documents of a snapshot, decoded only when they are used.
+
+    Implements `retrieval.IndexedDocuments`, so a `HybridRetriever` filters
+    them by metadata from the mapped records without decoding any.
+    """
+
+    def __init__(self, snapshot: MappedSnapshot):
+        """Read documents from the snapshot."""
+        self._snapshot = snapshot
+        # string numbers each metadata column takes, found on first use
+        self._distinct: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        """Return the number of documents."""
+        return len(self._snapshot)
+
+    @overload
+    def __getitem__(self, n: int) -> Document: ...
+
+    @overload
+    def __getitem__(self, n: slice) -> list[Document]: ...
+
+    def __getitem__(self, n: int | slice) -> Document | list[Document]:
+        """Decode document number `n` (or a slice of them)."""
+        if isinstance(n, slice):
+            return [self[i] for i in range(len(self))[n]]
+        return self._snapshot.document(range(len(self))[n])
+
+    def values(self, field: str) -> list[str]:
+        """Return the distinct values of a metadata field, sorted."""
+        if field not in METADATA_FIELDS:
+            return sorted({str(d.metadata[field]) for d in self if field in d.metadata})
+        return sorted(
+            "None" if s == NONE else self._snapshot.string(int(s))
+            for s in self._distinct_values(field) if s != MISSING
+        )
+
+    def matching(self, filters: Filters) -> list[int]:
+        """Return the positions of the documents matching the filters.
+
+        Matches as `retrieval.matches_filters` does, comparing each distinct
+        value of a column once rather than every document's.
+        """
+        if any(k not in METADATA_FIELDS for k in filters):
+            return [i for i, d in enumerate(self) if matches_filters(d, filters)]
+        records = self._snapshot.records
+        extra = records[:, COLUMNS.index("extra_metadata")]
+        keep = np.ones(len(self), dtype=bool)
+        for field, value in filters.items():
+            column = records[:, COLUMNS.index(field)]
+            matched = [
+                s for s in self._distinct_values(field)
+                if s != MISSING and value in ("none" if s == NONE else self._snapshot.string(int(s)).lower())
+            ]
+            # filters only apply to metadata a document carries, which for a
+            # value that was not a string is in its extra metadata
+            absent = column == MISSING
+            for n in np.flatnonzero(absent & (extra != NONE) & keep):
+                absent[n] = matches_filters(self._snapshot.document(int(n)), {field: value})
+            keep &= np.isin(column, matched) | absent
+        return np.flatnonzero(keep).tolist()
+
+    def _distinct_values(self, field: str) -> np.ndarray:
+        if field not in self._distinct:
+            self._distinct[field] = np.unique(self._snapshot.records[:, COLUMNS.index(field)])
+        return self._distinct[field]
+
+
+class MappedBM25Index:
+    """A snapshot's BM25 keyword index, scored from the mapping.
+
+    Scores as `retrieval.BM25Index` over the same texts does, from the term
+    statistics written with the snapshot.
+    """
+
+    def __init__(self, snapshot: MappedSnapshot, k1: float = 1.5, b: float = 0.75):
+        """Use the index stored in the snapshot."""
+        self.k1 = k1
+        self.b = b
+        self._snapshot = snapshot
+        self.avg_length = float(snapshot.lengths.mean()) if len(snapshot) else 0.0
+
+    @property
+    def vocabulary_size(self) -> int:
+        """Number of distinct terms in the index."""
+        return len(self._snapshot.terms)
+
+    def score(self, query: str, candidates: Sequence[int]) -> list[tuple[int, float]]:
+        """Score candidate documents, best first; see `BM25Index.score`."""
+        snapshot = self._snapshot
+        terms = [n for n in (self._term(t) for t in set(tokenize(query))) if n is not None]
+        if not terms:
+            return [(i, 0.0) for i in candidates]
+        positions = np.asarray(candidates, dtype=np.intp)
+        documents = len(snapshot)
+        norm = self.k1 * (1 - self.b + self.b * snapshot.lengths[positions] / (self.avg_length or 1))
+        scores = np.zeros(len(positions))
+        ceiling = 0.0
+        for n in terms:
+            start, end = int(snapshot.postings[n]), int(snapshot.postings[n + 1])
+            df = end - start
+            idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+            ceiling += idf
+            docs = snapshot.posting_docs[start:end]
+            found = np.minimum(np.searchsorted(docs, positions), df - 1)
+            tf = np.where(docs[found] == positions, snapshot.posting_counts[start:end][found], 0)
+            scores += idf * tf * (self.k1 + 1) / (tf + norm)
+        confidence = np.minimum(scores / ceiling, 1.0)
+        return sorted(zip(positions.tolist(), confidence.tolist()), key=lambda p: p[1], reverse=True)
+
+    def with_changes(self, keep: Sequence[int], texts: Sequence[str]) -> BM25Index:
+        """Return an in-memory index of the kept positions followed by new texts."""
+        snapshot = self._snapshot
+        term_freqs: list[Counter[str]] = [Counter() for _ in range(len(snapshot))]
+        for n, string in enumerate(snapshot.terms):
+            term = snapshot.string(int(string))
+            start, end = int(snapshot.postings[n]), int(snapshot.postings[n + 1])
+            for doc, count in zip(snapshot.posting_docs[start:end], snapshot.posting_counts[start:end]):
+                term_freqs[doc][term] = int(count)
+        index = BM25Index([], self.k1, self.b)
+        index.term_freqs = term_freqs
+        index.lengths = [int(n) for n in snapshot.lengths]
+        for tf in term_freqs:
+            index.doc_freqs.update(tf.keys())
+        return index.with_changes(keep, texts)
+
+    def _term(self, term: str) -> Optional[int]:
+        snapshot = self._snapshot
+        n = bisect.bisect_left(snapshot.terms, term, key=lambda s: snapshot.string(int(s)))
+        if n < len(snapshot.terms) and snapshot.string(int(snapshot.terms[n])) == term:
+            return n
+        return None
+
+
+def write_snapshot(
+    path: str,
+    pages: Sequence[dict],
+    documents: Sequence[Document],
+    embeddings: Optional[np.ndarray] = None,
+) -> None:
+    """Write a snapshot file atomically.
+
+    Args:
+        path (str): Where to write; replaced if it exists.
+        pages (Sequence[dict]): The parsed pages.
+        documents (Sequence[Document]): Documents with an id each, eg from
+            `documents.build_documents`.
+        embeddings (np.ndarray, optional): One row per document.
+
+    Raises:
+        ValueError: When a document has no id, or the embeddings do not have
+            one row per document.
+    """
+    table = _StringTable()
+    for page in pages:
+        table.append(json.dumps(page))
+    rows = np.zeros((len(documents), len(COLUMNS)), dtype="<u4")
+    for n, doc in enumerate(documents):
+        if not doc.id:
+            raise ValueError(f"Document {n} has no id")
+        # anything that would not round trip through the string table
+        extra = {
+            k: v for k, v in doc.metadata.items()
+            if k not in METADATA_FIELDS or not (v is None or isinstance(v, str))
+        }
+        rows[n] = [
+            table.add(doc.id),
+            table.add(doc.page_content),
+            *(
+                MISSING if name not in doc.metadata or name in extra else table.add(doc.metadata[name])
+                for name in METADATA_FIELDS
+            ),
+            table.add(json.dumps(extra) if extra else None),
+        ]
+
+    if embeddings is None:
+        vectors = np.zeros((len(documents), 0), dtype="<f4")
+    else:
+        vectors = np.ascontiguousarray(embeddings, dtype="<f4")
+        if vectors.ndim != 2 or len(vectors) != len(documents):
+            raise ValueError(f"Expected {len(documents)} embeddings, but got {len(vectors)}")
+
+    # the keyword index, inverted: for each term the documents it occurs in
+    lexical = BM25Index([d.page_content for d in documents])
+    terms = sorted(lexical.doc_freqs)
+    term_numbers = {t: n for n, t in enumerate(terms)}
+    postings: list[list[tuple[int, int]]] = [[] for _ in terms]
+    for position, tf in enumerate(lexical.term_freqs):
+        for term, count in tf.items():
+            postings[term_numbers[term]].append((position, count))
+    posting_offsets = np.zeros(len(terms) + 1, dtype="<u8")
+    np.cumsum([len(p) for p in postings], out=posting_offsets[1:])
+    entries = np.array([e for p in postings for e in p], dtype="<u4").reshape(-1, 2)
+    term_strings = np.array([table.add(t) for t in terms], dtype="<u4")
+
+    data = b"".join(table.encoded)
+    string_offsets = np.zeros(len(table.encoded) + 1, dtype="<u8")
+    np.cumsum([len(s) for s in table.encoded], out=string_offsets[1:])
+    sections = [
+        string_offsets.tobytes(),
+        data,
+        rows.tobytes(),
+        vectors.tobytes(),
+        term_strings.tobytes(),
+        posting_offsets.tobytes(),
+        np.ascontiguousarray(entries[:, 0]).tobytes(),
+        np.ascontiguousarray(entries[:, 1]).tobytes(),
+        np.array(lexical.lengths, dtype="<u4").tobytes(),
+    ]
+    offsets = []
+    position = _aligned(_HEADER.size)
+    for section in sections:
+        offsets.append(position)
+        position = _aligned(position + len(section))
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(documents), len(COLUMNS), vectors.shape[1],
+        len(table.encoded), len(pages), len(terms), *offsets,
+    )
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for offset, section in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.encoded: list[bytes] = []
+        self._numbers: dict[str, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        if value not in self._numbers:
+            self._numbers[value] = len(self.encoded)
+            self.encoded.append(value.encode("utf-8"))
+        return self._numbers[value]
+
+    def append(self, value: str) -> int:
+        # a string of its own, even when equal to one already in the table
+        self.encoded.append(value.encode("utf-8"))
+        return len(self.encoded) - 1
+
+
+def _aligned(position: int) -> int:
+    return -(-position // _ALIGN) * _ALIGN
@@ -0,0 +1,217 @@
+"""A long running soak test of the graph with a scripted model.
+
+Drives thousands of conversations through the real graph, with a scripted
+chat model in place of the provider's and the schedule tool fetching from a
+local synthetic site (see `fakesite`), then fits a line to the process's
+resident memory over the conversations. The run fails if memory grows
+faster than the allowed slope, eg
+
+    python -m react_agent.soak --conversations 5000 --max-slope 2048
+
+By default each conversation's thread is deleted from the checkpointer once
+it ends, as a deployment expiring old threads would, so what is measured is
+growth everywhere else; `--keep-threads` includes the checkpointer.
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib
+import logging
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Sequence
+from unittest import mock
+
+import numpy as np
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from react_agent.diagnostics import METRICS, log_metrics
+from react_agent.fakesite import FakeSiteServer, generate_site
+from react_agent.memory import MONITOR, rss_bytes
+from react_agent.prefetch import looks_like_schedule_query
+from react_agent.utils import get_message_text
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS = [
+    "When is preschool swim on Tuesday?",
+    "Thanks! What about the weekend?",
+    "What is the capital of France?",
+    "Is there a preschool swim at {location}?",
+    "Tell me a joke",
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Calls the schedule tool for schedule questions and answers anything else directly."""
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        """Tools are known in advance; nothing to bind."""
+        return self
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        last = messages[-1]
+        text = get_message_text(last)
+        if isinstance(last, HumanMessage) and looks_like_schedule_query(text):
+            message = AIMessage(content="", tool_calls=[{
+                "name": "get_preschool_swim_times",
+                "args": {"query": text},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            }])
+        else:
+            message = AIMessage(content=f"Answer after {len(messages)} messages: {text[:80]}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        return self._generate(messages, stop, **kwargs)
+
+
+@dataclass
+class SoakResult:
+    """The resident memory samples of a soak run and the line fitted to them."""
+
+    conversations: int
+    samples: list[tuple[int, int]]
+    """(conversations completed, resident bytes) after the warm up."""
+    slope: float
+    """Resident memory growth in bytes per conversation."""
+    max_slope: float
+
+    @property
+    def passed(self) -> bool:
+        """Whether memory grew no faster than allowed, over at least two samples."""
+        return len(self.samples) >= 2 and self.slope <= self.max_slope
+
+
+@contextmanager
+def scripted_model() -> Iterator[None]:
+    """Make the graph use `ScriptedChatModel` whatever model is configured."""
+    module = importlib.import_module("react_agent.graph")
+    with mock.patch.object(module, "load_chat_model", lambda name, **kwargs: ScriptedChatModel()):
+        yield
+
+
+async def arun_soak(
+    conversations: int = 2000,
+    turns: int = 3,
+    max_slope: float = 2048,
+    warmup: int = 200,
+    sample_every: int = 50,
+    facilities: int = 20,
+    keep_threads: bool = False,
+    memory_diagnostics: bool = False,
+) -> SoakResult:
+    """Drive conversations through the graph and measure memory growth.
+
+    Args:
+        conversations (int): Conversations to run, each on a new thread.
+        turns (int): User messages per conversation.
+        max_slope (float): Allowed resident memory growth, in bytes per
+            conversation.
+        warmup (int): Conversations run before sampling starts, so caches
+            and indexes are filled.
+        sample_every (int): Conversations between samples.
+        facilities (int): Facility pages served to the schedule tool.
+        keep_threads (bool): Keep finished threads in the checkpointer.
+        memory_diagnostics (bool): Record memory after every run (slow).
+
+    Raises:
+        ValueError: When the arguments leave fewer than two samples to fit
+            a line to.
+    """
+    points = _sample_points(conversations, warmup, sample_every)
+    if len(points) < 2:
+        raise ValueError(
+            f"{conversations} conversations with a warm up of {warmup} and a sample "
+            f"every {sample_every} give fewer than two memory samples"
+        )
+    graph_module = importlib.import_module("react_agent.graph")
+    site = generate_site(facilities)
+    locations = [page.location for page in site.values()]
+    samples: list[tuple[int, int]] = []
+    with FakeSiteServer({path: page.html for path, page in site.items()}) as server, scripted_model():
+        configurable = {
+            "model": "scripted/soak",
+            "embedding_model": "local/hashing",
+            "ott_rec_facility_urls": [server.url(path) for path in site],
+            "memory_diagnostics": memory_diagnostics,
+        }
+        for n in range(conversations):
+            thread_id = f"soak-{n}"
+            for turn in range(turns):
+                question = QUESTIONS[(n + turn) % len(QUESTIONS)].format(location=locations[n % len(locations)])
+                await graph_module.graph.ainvoke(
+                    {"messages": [("user", question)]},
+                    {"configurable": {**configurable, "thread_id": thread_id}},
+                )
+            if not keep_threads:
+                graph_module.memory.delete_thread(thread_id)
+            done = n + 1
+            if done in points:
+                gc.collect()
+                samples.append((done, rss_bytes()))
+                logger.info("%d conversations, %.1f MiB resident", done, samples[-1][1] / 2**20)
+    if memory_diagnostics:
+        MONITOR.stop()
+
+    x, y = zip(*samples)
+    slope = float(np.polyfit(x, y, 1)[0])
+    METRICS.set("soak.rss_slope_bytes", slope)
+    return SoakResult(conversations, samples, slope, max_slope)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run a soak test; exits with 1 if memory grew faster than allowed."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=3, help="user messages per conversation")
+    parser.add_argument("--max-slope", type=float, default=2048, help="allowed resident memory growth in bytes per conversation")
+    parser.add_argument("--warmup", type=int, default=200, help="conversations before sampling starts")
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--facilities", type=int, default=20)
+    parser.add_argument("--keep-threads", action="store_true", help="keep finished threads in the checkpointer")
+    parser.add_argument("--memory-diagnostics", action="store_true", help="also record memory after every run")
+    args = parser.parse_args(argv)
+    if len(_sample_points(args.conversations, args.warmup, args.sample_every)) < 2:
+        parser.error("--conversations must leave room for at least two samples after --warmup, one every --sample-every")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    result = asyncio.run(arun_soak(
+        conversations=args.conversations,
+        turns=args.turns,
+        max_slope=args.max_slope,
+        warmup=args.warmup,
+        sample_every=args.sample_every,
+        facilities=args.facilities,
+        keep_threads=args.keep_threads,
+        memory_diagnostics=args.memory_diagnostics,
+    ))
+    log_metrics()
+    logger.info(
+        "%s: resident memory grew %.0f bytes per conversation (allowed %.0f)",
+        "passed" if result.passed else "FAILED", result.slope, result.max_slope,
+    )
+    return 0 if result.passed else 1
+
+
+def _sample_points(conversations: int, warmup: int, sample_every: int) -> list[int]:
+    # the numbers of completed conversations after which memory is sampled
+    if sample_every < 1:
+        return []
+    return list(range(warmup or sample_every, conversations + 1, sample_every))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
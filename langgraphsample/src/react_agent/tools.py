@@ -34,4 +34,8 @@ def search(
     return cast(list[dict[str, Any]], result)
 
 
-TOOLS: List[Callable[..., Any]] = [search, ottawarec.get_preschool_swim_times]
+TOOLS: List[Callable[..., Any]] = [
+    search,
+    ottawarec.get_preschool_swim_times,
+    ottawarec.get_schedule_times_batch,
+]
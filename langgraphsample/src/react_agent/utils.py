@@ -1,9 +1,15 @@
 """Utility & helper functions."""
 
+from typing import Any, Optional, cast
+
 from langchain.chat_models import init_chat_model
+from langchain.embeddings import init_embeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
 
+from react_agent.embeddings import HashingEmbeddings
+
 
 def get_message_text(msg: BaseMessage) -> str:
     """Get the text content of a message."""
@@ -17,11 +23,38 @@ def get_message_text(msg: BaseMessage) -> str:
         return "".join(txts).strip()
 
 
-def load_chat_model(fully_specified_name: str) -> BaseChatModel:
+def approximate_tokens(text: str) -> int:
+    """Roughly estimate the tokens in some text (about four characters each)."""
+    return len(text) // 4 + 1
+
+
+def load_chat_model(fully_specified_name: str, max_retries: Optional[int] = None) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
+        max_retries (int, optional): Retries the provider's client makes on
+            its own; 0 when a governor retries instead. Defaults to the
+            client's own setting.
+    """
+    provider, model = fully_specified_name.split("/", maxsplit=1)
+    return init_chat_model(model, model_provider=provider, **_retry_kwargs(max_retries))
+
+
+def load_embeddings(fully_specified_name: str, max_retries: Optional[int] = None) -> Embeddings:
+    """Load an embedding model from a fully specified name.
+
+    The "local" provider needs no network, eg 'local/hashing'.
+
+    Args:
+        fully_specified_name (str): String in the format 'provider/model'.
+        max_retries (int, optional): As for `load_chat_model`.
     """
     provider, model = fully_specified_name.split("/", maxsplit=1)
-    return init_chat_model(model, model_provider=provider)
+    if provider == "local":
+        return HashingEmbeddings()
+    return cast(Embeddings, init_embeddings(model, provider=provider, **_retry_kwargs(max_retries)))
+
+
+def _retry_kwargs(max_retries: Optional[int]) -> dict[str, Any]:
+    return {} if max_retries is None else {"max_retries": max_retries}
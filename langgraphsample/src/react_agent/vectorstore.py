@@ -0,0 +1,204 @@
+"""An in-memory vector store backed by a single NumPy matrix.
+
+`langchain_core`'s `InMemoryVectorStore` keeps one Python list per document
+and scores them one at a time. Here every embedding lives in one contiguous
+float32 matrix, so scoring is a matrix product and top-k an `argpartition`,
+which stays well under a millisecond for tens of thousands of records.
+"""
+
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+FULL_SCAN_FRACTION = 0.25
+"""Share of the rows above which `top_k` scores every row and keeps the
+candidates' scores, rather than copying the candidate rows out first."""
+
+
+class MatrixVectorStore(VectorStore):
+    """Cosine similarity search over a contiguous float32 embedding matrix."""
+
+    def __init__(self, embedding: Embeddings):
+        """Create an empty store that embeds with the given model."""
+        self.embedding = embedding
+        self.documents: Sequence[Document] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._count = 0
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """The embedding model used by the store."""
+        return self.embedding
+
+    @property
+    def ids(self) -> list[str]:
+        """The documents' ids, or their positions for those without one."""
+        return [d.id or str(n) for n, d in enumerate(self.documents)]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The (documents, dimensions) matrix of unit length embeddings."""
+        return self._matrix[: self._count]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held for the matrix, including spare capacity and rows mapped from a bundle."""
+        return self._matrix.nbytes
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Embed and add texts to the store."""
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(self._count + i) for i in range(len(texts))]
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        docs = [Document(id=i, page_content=t, metadata=m) for i, t, m in zip(ids, texts, metadatas)]
+        self.add_vectors(vectors, docs)
+        return ids
+
+    def add_vectors(self, vectors: np.ndarray, documents: Sequence[Document]) -> None:
+        """Add precomputed embeddings for the given documents."""
+        if not len(documents):
+            return
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+        if self._count and vectors.shape[1] != self._matrix.shape[1]:
+            raise ValueError(
+                f"Expected embeddings of size {self._matrix.shape[1]}, but got {vectors.shape[1]}"
+            )
+        needed = self._count + len(documents)
+        if needed > self._matrix.shape[0] or not self._count:
+            # grow geometrically so repeated adds stay amortised O(1) per row
+            grown = np.zeros((max(needed, 2 * self._matrix.shape[0]), vectors.shape[1]), dtype=np.float32)
+            if self._count:
+                grown[: self._count] = self._matrix[: self._count]
+            self._matrix = grown
+        self._matrix[self._count : needed] = vectors
+        self._count = needed
+        # documents adopted by `from_matrix` are copied into a list first
+        kept = self.documents if isinstance(self.documents, list) else list(self.documents)
+        kept.extend(documents)
+        self.documents = kept
+
+    @classmethod
+    def from_matrix(
+        cls, embedding: Embeddings, matrix: np.ndarray, documents: Sequence[Document]
+    ) -> "MatrixVectorStore":
+        """Create a store over an existing embedding matrix without copying it.
+
+        Used with read only views such as a memory mapped snapshot's; any
+        later change to the store copies the matrix first. A matrix whose
+        rows are not unit length is normalised into a copy instead.
+        """
+        store = cls(embedding)
+        matrix = np.asarray(matrix).reshape(len(documents), -1)
+        if matrix.dtype != np.float32 or not np.allclose(np.linalg.norm(matrix, axis=1), 1, atol=1e-3):
+            store.add_vectors(matrix, documents)
+            return store
+        store._matrix = matrix
+        store._count = len(documents)
+        # kept as given, so documents mapped from a snapshot stay undecoded
+        store.documents = documents
+        return store
+
+    def subset(self, positions: Sequence[int]) -> "MatrixVectorStore":
+        """Return a new store with copies of the rows at the given positions.
+
+        Nothing is re-embedded; this store is left unchanged.
+        """
+        store = MatrixVectorStore(self.embedding)
+        store.add_vectors(self.matrix[list(positions)], [self.documents[n] for n in positions])
+        return store
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Remove documents by id, compacting the matrix."""
+        drop = set(ids or [])
+        keep = [n for n, i in enumerate(self.ids) if i not in drop]
+        self._matrix = np.ascontiguousarray(self.matrix[keep])
+        self._count = len(keep)
+        self.documents = [self.documents[n] for n in keep]
+        return True
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        """Return the documents most similar to the query."""
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        """Return the documents most similar to the embedding.
+
+        Accepts the same `filter` callable as `InMemoryVectorStore`.
+        """
+        return self.similarity_search_by_vectors(np.asarray([embedding]), k, **kwargs)[0]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: np.ndarray,
+        k: int = 4,
+        filter: Optional[Callable[[Document], bool]] = None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        """Return the top k documents for each row of a query matrix at once."""
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        if not self._count:
+            return [[] for _ in queries]
+        candidates = None
+        if filter is not None:
+            candidates = np.flatnonzero([filter(d) for d in self.documents])
+        return [[self.documents[n] for n in row] for row in self.top_k(queries, k, candidates)]
+
+    def top_k(
+        self, queries: np.ndarray, k: int, candidates: Optional[np.ndarray] = None
+    ) -> List[np.ndarray]:
+        """Return the positions of the k best scoring documents per query, best first.
+
+        Args:
+            queries (np.ndarray): (queries, dimensions) unit length matrix.
+            k (int): Results per query.
+            candidates (np.ndarray, optional): Positions to restrict the search to.
+        """
+        if not len(self.matrix) or (candidates is not None and not len(candidates)):
+            return [np.array([], dtype=np.intp) for _ in queries]
+        if candidates is None:
+            scores = queries @ self.matrix.T
+        elif len(candidates) <= FULL_SCAN_FRACTION * len(self.matrix):
+            # few candidates: copying their rows is cheaper than scoring all
+            scores = queries @ self.matrix[candidates].T
+        else:
+            scores = (queries @ self.matrix.T)[:, candidates]
+        k = min(k, scores.shape[1])
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        top = np.take_along_axis(top, order, axis=1)
+        if candidates is not None:
+            top = candidates[top]
+        return list(top)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "MatrixVectorStore":
+        """Create a store from texts."""
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+from react_agent import bundle, ottawarec
+from react_agent.configuration import Configuration
+from react_agent.documents import build_documents
+from react_agent.embeddings import HashingEmbeddings
+
+PAGES = [{
+  "location": "Walter Baker Sports Centre",
+  "url": "walterbaker",
+  "schedule_changes": [],
+  "time_blocks": [{
+    "category": "swim and aquafit",
+    "time_block_start": "January 28",
+    "time_block_end": "March 21",
+    "activities": [
+      {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday", "time_slots": "10 - 11am"},
+      {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Sunday", "time_slots": "12pm - 2pm"},
+    ],
+  }],
+}]
+
+def test_write_and_load_bundle(tmp_path):
+  assert bundle.current_version(str(tmp_path)) is None
+  docs = build_documents(PAGES)
+  vectors = HashingEmbeddings().embed_matrix([d.page_content for d in docs])
+  version = bundle.write_bundle(str(tmp_path), PAGES, docs, vectors, "local/hashing")
+  assert bundle.current_version(str(tmp_path)) == version
+  assert sorted(os.listdir(tmp_path)) == sorted(["CURRENT", version])
+
+  loaded = bundle.load_bundle(str(tmp_path))
+  assert loaded.version == version
+  assert list(loaded.pages) == PAGES
+  assert list(loaded.documents) == docs
+  assert loaded.lexical is not None
+  assert np.array_equal(loaded.embeddings, vectors)
+  assert loaded.manifest["embedding_model"] == "local/hashing"
+
+class NoEmbeddings(HashingEmbeddings):
+  def embed_documents(self, texts):
+    raise AssertionError("should use the bundle's vectors")
+
+def test_store_serves_bundle(tmp_path):
+  docs = build_documents(PAGES)
+  vectors = HashingEmbeddings().embed_matrix([d.page_content for d in docs])
+  bundle.write_bundle(str(tmp_path), PAGES, docs, vectors, "local/hashing")
+
+  store = ottawarec.ScheduleStore(["walterbaker"], NoEmbeddings(), bundle_dir=str(tmp_path), embedding_model="local/hashing")
+  # nothing to compare a first bundle with
+  assert store.load_bundle() == []
+  with_state = ottawarec.ScheduleStore(
+    ["walterbaker"], NoEmbeddings(), state_dir=str(tmp_path / "state"), bundle_dir=str(tmp_path), embedding_model="local/hashing"
+  )
+  assert len(with_state.load_bundle()) == 2
+  snapshot = store.snapshot
+  assert snapshot.retriever._vector_store is not None
+  assert snapshot.retriever.vector_store.matrix.shape == (2, 128)
+  # nothing new; the store keeps serving the same index without fetching
+  store.max_age_seconds = 0
+  assert asyncio.run(store.arefresh()) == []
+  assert store.snapshot.retriever is snapshot.retriever
+
+def test_store_maps_bundle_vectors(tmp_path):
+  docs = build_documents(PAGES)
+  vectors = HashingEmbeddings().embed_matrix([d.page_content for d in docs])
+  bundle.write_bundle(str(tmp_path), PAGES, docs, vectors, "local/hashing")
+  loaded = bundle.load_bundle(str(tmp_path))
+
+  snapshot = ottawarec.ScheduleSnapshot.from_bundle(loaded, HashingEmbeddings(), embedding_model="local/hashing")
+  store = snapshot.retriever.vector_store
+  assert np.shares_memory(store.matrix, loaded.embeddings)
+  # changes copy the mapped matrix rather than writing to it
+  store.add_vectors(vectors[:1], docs[:1])
+  assert store.matrix.shape == (3, 128)
+  assert np.array_equal(loaded.embeddings, vectors)
+
+def test_load_first_format_bundle(tmp_path):
+  docs = build_documents(PAGES)
+  path = tmp_path / "v1"
+  path.mkdir()
+  (path / "manifest.json").write_text(json.dumps({"format_version": 1, "version": "v1", "embedding_model": None}))
+  (path / "pages.json").write_text(json.dumps(PAGES))
+  (path / "documents.jsonl").write_text("".join(json.dumps({"id": d.id, "page_content": d.page_content, "metadata": d.metadata}) + "\n" for d in docs))
+  (tmp_path / "CURRENT").write_text("v1")
+
+  loaded = bundle.load_bundle(str(tmp_path))
+  assert (loaded.pages, loaded.documents, loaded.embeddings) == (PAGES, docs, None)
+
+def test_preload_creates_no_embedding_model(tmp_path, monkeypatch):
+  monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+  monkeypatch.setattr(ottawarec, "_stores", {})
+  monkeypatch.setattr(ottawarec, "_preloaded", {})
+  docs = build_documents(PAGES)
+  vectors = HashingEmbeddings().embed_matrix([d.page_content for d in docs])
+  version = bundle.write_bundle(str(tmp_path), PAGES, docs, vectors, "local/hashing")
+
+  # the default, remote, embedding model is never loaded
+  assert ottawarec.preload(Configuration(schedule_bundle_dir=str(tmp_path))) == version
+  assert ottawarec._stores == {}
+  # the store the queries use starts from the preloaded bundle
+  monkeypatch.setattr(ottawarec, "load_bundle", lambda *args: pytest.fail("bundle read twice"))
+  store = ottawarec.get_store(Configuration(schedule_bundle_dir=str(tmp_path), embedding_model="local/hashing"))
+  store.load_bundle()
+  assert store.bundle_version == version
+  assert store.snapshot.retriever.vector_store is not None
@@ -0,0 +1,72 @@
+import copy
+
+from react_agent import changes
+
+def page(tuesday="10 - 11am"):
+  return {
+    "location": "Walter Baker Sports Centre",
+    "url": "walterbaker",
+    "time_blocks": [{
+      "category": "swim and aquafit",
+      "time_block_start": "January 28",
+      "time_block_end": "March 21",
+      "activities": [
+        {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday", "time_slots": tuesday},
+        {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Sunday", "time_slots": "12pm - 2pm"},
+      ],
+    }],
+  }
+
+def test_diff_pages_unchanged():
+  assert changes.diff_pages([page()], [page()]) == []
+
+def test_diff_pages():
+  after = page("9 - 10am")
+  after["time_blocks"][0]["activities"].pop()
+  after["time_blocks"][0]["activities"].append(
+    {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Friday", "time_slots": "8 - 9am"}
+  )
+  diff = changes.diff_pages([page()], [after])
+  assert [(c.op, c.key.split(" | ")[-1]) for c in diff] == [
+    ("changed", "Tuesday #0"),
+    ("added", "Friday #0"),
+    ("removed", "Sunday #0"),
+  ]
+  assert diff[0].previous["time_slots"] == "10 - 11am"
+  assert diff[0].record["time_slots"] == "9 - 10am"
+  assert diff[2].record is None
+
+def test_diff_pages_repeated_rows():
+  before = page()
+  after = copy.deepcopy(before)
+  after["time_blocks"][0]["activities"].append(dict(after["time_blocks"][0]["activities"][0], time_slots="1 - 2pm"))
+  assert [(c.op, c.record["time_slots"]) for c in changes.diff_pages([before], [after])] == [("added", "1 - 2pm")]
+
+def test_change_feed(tmp_path):
+  feed = changes.ChangeFeed(str(tmp_path / "feed" / "changes.jsonl"))
+  assert feed.read() == []
+  assert feed.append(changes.diff_pages([], [page()])) == 2
+  assert feed.append(changes.diff_pages([page()], [page("9 - 10am")])) == 3
+  # consumers resume from the last sequence number they handled
+  assert [e["op"] for e in feed.read(since=2)] == ["changed"]
+  # a reopened feed continues the sequence
+  reopened = changes.ChangeFeed(feed.path)
+  assert reopened.last_seq == 3
+  assert reopened.append([]) == 3
+
+def test_change_feed_after_crash(tmp_path):
+  feed = changes.ChangeFeed(str(tmp_path / "changes.jsonl"))
+  feed.append(changes.diff_pages([], [page()]))
+  with open(feed.path, "a", encoding="utf-8") as f:
+    f.write('{"seq": 3, "at": ')
+  # the partial line is dropped rather than appended to
+  assert feed.append(changes.diff_pages([page()], [page("9 - 10am")])) == 3
+  assert [e["seq"] for e in changes.ChangeFeed(feed.path).read()] == [1, 2, 3]
+
+def test_change_feed_shared(tmp_path):
+  path = str(tmp_path / "changes.jsonl")
+  first, second = changes.ChangeFeed(path), changes.ChangeFeed(path)
+  first.append(changes.diff_pages([], [page()]))
+  # the second writer continues after the first's entries
+  assert second.append(changes.diff_pages([page()], [page("9 - 10am")])) == 3
+  assert [e["seq"] for e in second.read()] == [1, 2, 3]
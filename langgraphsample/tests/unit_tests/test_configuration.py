@@ -10,6 +10,7 @@ def test_configuration_defaults():
     assert cfg.system_prompt == prompts.SYSTEM_PROMPT
     assert cfg.model == "openai/gpt-4-turbo-preview"
     assert cfg.max_search_results == 10
+    assert cfg.embedding_model == "openai/text-embedding-ada-002"
 
 def test_configuration_configurable():
     cfg = Configuration.from_runnable_config({
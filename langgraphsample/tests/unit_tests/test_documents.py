@@ -0,0 +1,61 @@
+from react_agent import documents
+
+PAGE = {
+  "location": "Walter Baker Sports Centre",
+  "url": "myurl",
+  "time_blocks": [
+    {
+      "category": "swim and aquafit",
+      "time_block_start": "January 28",
+      "time_block_end": "March 21",
+      "activities": [
+        {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday", "time_slots": "10 - 11am"},
+        {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Sunday", "time_slots": "12pm - 2pm"},
+      ],
+    },
+    {
+      "category": "swim and aquafit",
+      "time_block_start": "March 22",
+      "time_block_end": "June 22",
+      "activities": [
+        {"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday", "time_slots": "8 - 9am"},
+      ],
+    },
+  ],
+}
+
+def test_iter_records():
+  records = list(documents.iter_records([PAGE]))
+  assert len(records) == 3
+  assert records[2] == {
+    "location": "Walter Baker Sports Centre",
+    "activity": "Preschool swim",
+    "day": "Tuesday",
+    "time_slots": "8 - 9am",
+    "category": "swim and aquafit",
+    "time_block_start": "March 22",
+    "time_block_end": "June 22",
+    "url": "myurl",
+  }
+  assert all(list(r) == documents.RECORD_FIELDS for r in records)
+
+def test_build_documents():
+  docs = documents.build_documents([PAGE])
+  assert [d.page_content for d in docs] == [
+    "Preschool swim at Walter Baker Sports Centre on Tuesday: 10 - 11am (January 28 to March 21); 8 - 9am (March 22 to June 22)",
+    "Preschool swim at Walter Baker Sports Centre on Sunday: 12pm - 2pm (January 28 to March 21)",
+  ]
+  assert docs[0].metadata == {
+    "location": "Walter Baker Sports Centre",
+    "activity": "Preschool swim",
+    "day": "Tuesday",
+    "time_slots": "10 - 11am (January 28 to March 21); 8 - 9am (March 22 to June 22)",
+    "category": "swim and aquafit",
+    "url": "myurl",
+  }
+  assert docs[0].id == documents.content_hash(docs[0].page_content)
+
+def test_build_documents_dedup():
+  # the same facility listed twice
+  assert len(documents.build_documents([PAGE, PAGE])) == 2
+  assert documents.build_documents([PAGE, PAGE]) == documents.build_documents([PAGE])
@@ -0,0 +1,18 @@
+import numpy as np
+from react_agent.embeddings import HashingEmbeddings
+from react_agent.utils import load_embeddings
+
+def test_hashing_embeddings():
+  embeddings = HashingEmbeddings(size=64)
+  matrix = embeddings.embed_matrix(["Preschool swim at Minto", "preschool  SWIM at minto", "Public skate", ""])
+  assert matrix.dtype == np.float32
+  assert matrix.shape == (4, 64)
+  assert np.allclose(np.linalg.norm(matrix[:3], axis=1), 1.0)
+  # case and spacing do not matter, and empty text is the zero vector
+  assert np.allclose(matrix[0], matrix[1])
+  assert not matrix[3].any()
+  assert matrix[0] @ matrix[1] > matrix[0] @ matrix[2]
+  assert embeddings.embed_query("Public skate") == embeddings.embed_documents(["Public skate"])[0]
+
+def test_load_embeddings_local():
+  assert isinstance(load_embeddings("local/hashing"), HashingEmbeddings)
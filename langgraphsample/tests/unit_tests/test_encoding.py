@@ -0,0 +1,85 @@
+from react_agent import encoding
+from react_agent.documents import build_documents
+from react_agent.utils import approximate_tokens
+
+def page(location, days):
+  return {
+    "location": location,
+    "url": location,
+    "time_blocks": [{
+      "category": "swim",
+      "time_block_start": "March 22",
+      "time_block_end": "June 22",
+      "activities": [{"location": location, "activity": "Preschool swim", "day": d, "time_slots": "8 - 9am"} for d in days],
+    }],
+  }
+
+DOCS = build_documents([
+  page("Walter Baker Sports Centre", ["Monday", "Tuesday"]),
+  page("Minto Recreation Complex - Barrhaven", ["Friday"]),
+])
+
+def test_encode_schedule():
+  assert encoding.encode_schedule([], 100) == encoding.NO_RESULTS
+  assert encoding.encode_schedule(DOCS, 100) == "\n".join([
+    "Walter Baker Sports Centre | Preschool swim",
+    "Mon: 8 - 9am (March 22 to June 22)",
+    "Tue: 8 - 9am (March 22 to June 22)",
+    "Minto Recreation Complex - Barrhaven | Preschool swim",
+    "Fri: 8 - 9am (March 22 to June 22)",
+  ])
+
+def test_encode_schedule_groups_in_relevance_order():
+  text = encoding.encode_schedule([DOCS[2], DOCS[0], DOCS[1]], 100)
+  assert text.splitlines()[0] == "Minto Recreation Complex - Barrhaven | Preschool swim"
+  assert text.count("Walter Baker Sports Centre") == 1
+
+def test_encode_schedule_truncates_least_relevant():
+  text = encoding.encode_schedule(DOCS, 37)
+  assert text == "\n".join([
+    "Walter Baker Sports Centre | Preschool swim",
+    "Mon: 8 - 9am (March 22 to June 22)",
+    "Tue: 8 - 9am (March 22 to June 22)",
+    "(+1 less relevant rows omitted)",
+  ])
+  # the omitted line counts against the budget too
+  assert "Tue:" not in encoding.encode_schedule(DOCS, 36)
+
+def test_encode_schedule_budget_is_hard():
+  # a most relevant row too long for the budget is cut short
+  text = encoding.encode_schedule(DOCS, 24)
+  assert text == "\n".join([
+    "Walter Baker Sports Centre | Preschool swim",
+    "Mon: 8 - 9am (Marc…",
+    "(+2 less relevant rows omitted)",
+  ])
+  for budget in range(1, 40):
+    assert approximate_tokens(encoding.encode_schedule(DOCS, budget)) <= budget
+
+def test_encode_batch():
+  text = encoding.encode_batch({"monday": DOCS[:1], "nowhere": []}, 100)
+  assert text == "\n".join([
+    "# monday",
+    "Walter Baker Sports Centre | Preschool swim",
+    "Mon: 8 - 9am (March 22 to June 22)",
+    "",
+    "# nowhere",
+    encoding.NO_RESULTS,
+  ])
+
+def test_encode_batch_budget_is_hard():
+  results = {f"question {n}": DOCS for n in range(5)}
+  for budget in (20, 60, 100, 200):
+    assert approximate_tokens(encoding.encode_batch(results, budget)) <= budget
+
+def test_encode_batch_omits_least_relevant_queries():
+  results = {f"question {n}": DOCS for n in range(10)}
+  text = encoding.encode_batch(results, 100)
+  assert approximate_tokens(text) <= 100
+  assert text.startswith("# question 0\nWalter Baker Sports Centre | Preschool swim\nMon:")
+  assert "# question 9" not in text
+  assert text.endswith("less relevant queries omitted; ask for them separately)")
+  for queries in (1, 5, 30):
+    results = {f"question {n}": DOCS for n in range(queries)}
+    for budget in range(1, 200, 7):
+      assert approximate_tokens(encoding.encode_batch(results, budget)) <= budget
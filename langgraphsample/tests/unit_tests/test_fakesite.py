@@ -0,0 +1,58 @@
+import time
+
+import pytest
+import requests
+from react_agent import fakesite, ottawarec
+from react_agent.diagnostics import METRICS
+
+def test_generated_pages_parse_as_expected():
+  site = fakesite.generate_site(200, seed=7)
+  assert site == fakesite.generate_site(200, seed=7)
+  for path, page in site.items():
+    assert ottawarec.parse_html(page.html, path) == page.expected(path), page.html
+
+  # the variations the generator is meant to cover all occur
+  pages = list(site.values())
+  assert any(" - " in p.location for p in pages)
+  assert any(p.schedule_changes for p in pages)
+  assert any("n/a" in p.html for p in pages)
+  assert any("<ul>" in p.html for p in pages)
+  assert any(b["time_block_start"] is None for p in pages for b in p.time_blocks)
+  assert any("<table><tbody>" in p.html for p in pages)
+
+def test_server_etags_and_fetch_cache(monkeypatch):
+  monkeypatch.setattr(ottawarec, "_page_cache", {})
+  site = fakesite.generate_site(3)
+  pages = {path: page.html for path, page in site.items()}
+  METRICS.reset()
+  with fakesite.FakeSiteServer(pages) as server:
+    path = next(iter(site))
+    first = ottawarec.fetch_page(server.url(path))
+    assert first == site[path].expected(server.url(path))
+    assert ottawarec.fetch_page(server.url(path)) is first
+
+    pages[path] = pages[path].replace("Address", "Location")
+    assert ottawarec.fetch_page(server.url(path)) is not first
+    assert requests.get(server.url("/missing")).status_code == 404
+    assert server.metrics.snapshot() == {"requests": 4, "ok": 2, "not_modified": 1, "not_found": 1}
+  assert METRICS.get("fetch.parsed") == 2
+  assert METRICS.get("fetch.not_modified") == 1
+
+def test_server_errors_throttling_and_latency():
+  pages = {"/a": "<h1>A</h1>"}
+  with fakesite.FakeSiteServer(pages, error_rate=1.0) as server:
+    assert requests.get(server.url("/a")).status_code == 503
+    with pytest.raises(requests.HTTPError):
+      ottawarec.fetch_page(server.url("/a"))
+
+  with fakesite.FakeSiteServer(pages, requests_per_second=1.0) as server:
+    assert requests.get(server.url("/a")).status_code == 200
+    throttled = requests.get(server.url("/a"))
+    assert throttled.status_code == 429
+    assert throttled.headers["Retry-After"] == "1"
+    assert server.metrics.get("throttled") == 1
+
+  with fakesite.FakeSiteServer(pages, latency=0.05) as server:
+    started = time.perf_counter()
+    requests.get(server.url("/a"))
+    assert time.perf_counter() - started >= 0.05
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_openai import ChatOpenAI
+from react_agent import governor
+from react_agent.diagnostics import METRICS
+from react_agent.retrieval import HybridRetriever
+from react_agent.utils import load_chat_model, load_embeddings
+
+class RateLimited(Exception):
+  def __init__(self, headers):
+    self.status_code = 429
+    self.response = SimpleNamespace(headers=headers)
+
+def test_rate_limit_delay():
+  assert governor.rate_limit_delay(ValueError()) is None
+  assert governor.rate_limit_delay(RateLimited({})) == 0.0
+  assert governor.rate_limit_delay(RateLimited({"Retry-After": "2"})) == 2.0
+  assert governor.rate_limit_delay(RateLimited({"retry-after-ms": "250"})) == 0.25
+  assert governor.rate_limit_delay(RateLimited({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "1m30s"})) == 90.0
+  assert governor.rate_limit_delay(RateLimited({"retry-after": "soon"})) == 0.0
+
+def test_priority_and_concurrency():
+  async def scenario():
+    gov = governor.LLMGovernor(max_concurrency=1)
+    order = []
+    gate = asyncio.Event()
+
+    async def call(name):
+      order.append(name)
+      await gate.wait()
+
+    first = asyncio.create_task(gov.run(lambda: call("first")))
+    await asyncio.sleep(0)
+    background = asyncio.create_task(gov.run(lambda: call("background"), priority=governor.BACKGROUND))
+    interactive = asyncio.create_task(gov.run(lambda: call("interactive")))
+    await asyncio.sleep(0)
+    assert gov.in_flight == 1 and gov.queued == 2
+    gate.set()
+    await asyncio.gather(first, background, interactive)
+    return order
+  assert asyncio.run(scenario()) == ["first", "interactive", "background"]
+
+def test_retry_pauses_and_halves_concurrency():
+  async def scenario():
+    gov = governor.LLMGovernor(max_concurrency=4, max_retries=2)
+    attempts = []
+
+    async def call():
+      attempts.append(1)
+      if len(attempts) == 1:
+        raise RateLimited({"retry-after-ms": "20"})
+      return "ok"
+
+    assert await gov.run(call) == "ok"
+    return gov, attempts
+  gov, attempts = asyncio.run(scenario())
+  assert len(attempts) == 2
+  # halved to 2, then recovering by one request at a time
+  assert 2 < gov.limit < 3
+
+def test_gives_up_after_max_retries():
+  async def call():
+    raise RateLimited({"retry-after-ms": "1"})
+  with pytest.raises(RateLimited):
+    asyncio.run(governor.LLMGovernor(max_retries=1).run(call))
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+  calls: int = 0
+
+  async def aembed_documents(self, texts):
+    self.calls += 1
+    await asyncio.sleep(0.01)
+    return self.embed_documents(texts)
+
+def test_coalesce_embeddings():
+  async def scenario():
+    embeddings = governor.GovernedEmbeddings(CountingEmbeddings(size=4), governor.LLMGovernor())
+    results = await asyncio.gather(*(embeddings.aembed_documents(["a", "b"]) for _ in range(5)), embeddings.aembed_documents(["c"]))
+    return embeddings.embeddings.calls, results
+  before = METRICS.get("embeddings.coalesced")
+  calls, results = asyncio.run(scenario())
+  assert calls == 2
+  assert all(r == results[0] for r in results[:5])
+  assert METRICS.get("embeddings.coalesced") - before == 4
+
+# Local stub of a chat completions server that rate limits the first requests
+@pytest.fixture
+def stub_server():
+  state = {"requests": 0, "active": 0, "max_active": 0}
+  lock = threading.Lock()
+
+  class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+      pass
+
+    def do_POST(self):
+      self.rfile.read(int(self.headers["Content-Length"]))
+      with lock:
+        state["requests"] += 1
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        n = state["requests"]
+      try:
+        if n <= 2:
+          body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+          self.send_response(429)
+          self.send_header("retry-after-ms", "50")
+        else:
+          threading.Event().wait(0.02)
+          body = json.dumps({
+            "id": f"chatcmpl-{n}", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "hi"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+          }).encode()
+          self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+      finally:
+        with lock:
+          state["active"] -= 1
+
+  server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  yield f"http://127.0.0.1:{server.server_address[1]}/v1", state
+  server.shutdown()
+
+def test_against_stub_server(stub_server):
+  base_url, state = stub_server
+  model = ChatOpenAI(model="stub", base_url=base_url, api_key="stub", max_retries=0)
+
+  async def scenario():
+    gov = governor.LLMGovernor(max_concurrency=2, max_retries=3)
+    return await asyncio.gather(*(gov.run(lambda: model.ainvoke("hello")) for _ in range(6)))
+
+  before = METRICS.get("llm.rate_limited")
+  responses = asyncio.run(scenario())
+  assert [r.content for r in responses] == ["hi"] * 6
+  assert METRICS.get("llm.rate_limited") - before == 2
+  assert state["requests"] == 8
+  assert state["max_active"] <= 2
+
+def test_governed_clients_leave_retries_to_the_governor(monkeypatch):
+  monkeypatch.setenv("OPENAI_API_KEY", "stub")
+  assert load_chat_model("openai/gpt-4o-mini", max_retries=0).max_retries == 0
+  assert load_embeddings("openai/text-embedding-3-small", max_retries=0).max_retries == 0
+  assert load_chat_model("openai/gpt-4o-mini").max_retries != 0
+
+class AsyncOnlyEmbeddings(DeterministicFakeEmbedding):
+  def embed_documents(self, texts):
+    raise AssertionError("must go through the governor")
+
+  async def aembed_documents(self, texts):
+    return super().embed_documents(texts)
+
+def test_corpus_indexing_is_governed():
+  docs = [Document(id=str(i), page_content=f"Preschool swim {day}") for i, day in enumerate(["Monday", "Friday"])]
+
+  async def scenario():
+    gov = governor.LLMGovernor(max_concurrency=1)
+    embeddings = governor.GovernedEmbeddings(AsyncOnlyEmbeddings(size=8), gov)
+    retriever = HybridRetriever(docs, embeddings)
+    return await retriever.abatch_search([("anything", {})], k=1)
+
+  before = METRICS.snapshot().get("llm.queue_wait_seconds", {}).get("count", 0)
+  assert len(asyncio.run(scenario())[0]) == 1
+  # the documents and the query each went through the governor
+  assert METRICS.snapshot()["llm.queue_wait_seconds"]["count"] - before == 2
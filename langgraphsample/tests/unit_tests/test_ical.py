@@ -0,0 +1,118 @@
+import copy
+import os
+from datetime import date, datetime, time, timezone
+
+from react_agent import ical
+
+PAGE = {
+  "location": "Minto Recreation Complex - Barrhaven",
+  "url": "minto",
+  "schedule_changes": [{"start": "March 17", "end": "April 6", "description": "The pool is closed for annual maintenance."}],
+  "time_blocks": [{
+    "category": "swim and aquafit",
+    "time_block_start": "March 10",
+    "time_block_end": "April 20",
+    "activities": [
+      {"location": "Minto Recreation Complex - Barrhaven", "activity": "Preschool swim", "day": "Tuesday", "time_slots": "10 - 11am"},
+      {"location": "Minto Recreation Complex - Barrhaven", "activity": "Preschool swim", "day": "Sunday", "time_slots": "11 - 1pm, 2:30 - 3:15pm"},
+    ],
+  }],
+}
+NOW = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+def test_parse_time_slots():
+  tests = [
+    {"input": "n/a", "want": []},
+    {"input": "10 - 11am", "want": [(time(10), time(11))]},
+    {"input": "12pm - 2pm", "want": [(time(12), time(14))]},
+    {"input": "Noon - 1:30pm", "want": [(time(12), time(13, 30))]},
+    {"input": "11 - 1pm", "want": [(time(11), time(13))]},
+    {"input": "8:30 - 9:15am, 6 - 7pm", "want": [(time(8, 30), time(9, 15)), (time(18), time(19))]},
+  ]
+  for test in tests:
+    assert ical.parse_time_slots(test["input"]) == test["want"]
+
+def test_parse_month_day():
+  assert ical.parse_month_day("January 28", 2025) == date(2025, 1, 28)
+  assert ical.parse_month_day("Jan 28", 2025) == date(2025, 1, 28)
+  assert ical.parse_month_day("Sept. 3", 2025) == date(2025, 9, 3)
+
+def test_build_events():
+  events = ical.build_events([PAGE], 2025)
+  assert len(events) == 3
+  tuesday = events[0]
+  assert tuesday.feed == "minto-recreation-complex-barrhaven--preschool-swim.ics"
+  assert tuesday.start == datetime(2025, 3, 11, 10)
+  assert tuesday.end == datetime(2025, 3, 11, 11)
+  assert tuesday.until == date(2025, 4, 20)
+  # closed Tuesdays, March 18 to April 1
+  assert tuesday.exdates == [datetime(2025, 3, 18, 10), datetime(2025, 3, 25, 10), datetime(2025, 4, 1, 10)]
+  assert [e.start for e in events[1:]] == [datetime(2025, 3, 16, 11), datetime(2025, 3, 16, 14, 30)]
+  # uids depend on what the slot is, not when it is
+  moved = copy.deepcopy(PAGE)
+  moved["time_blocks"][0]["activities"][0]["time_slots"] = "9 - 10am"
+  assert [e.uid for e in ical.build_events([moved], 2025)] == [e.uid for e in events]
+  assert len({e.uid for e in events}) == 3
+
+def test_build_events_skips_unreadable_dates():
+  page = copy.deepcopy(PAGE)
+  unreadable = copy.deepcopy(page["time_blocks"][0])
+  unreadable["time_block_start"] = "Labour Day"
+  unreadable["activities"][0]["activity"] = "Aquafit"
+  page["time_blocks"].append(unreadable)
+  events = ical.build_events([page], 2025)
+  assert len(events) == 3
+  assert all("aquafit" not in e.feed for e in events)
+
+def test_build_events_closures_into_next_year():
+  page = copy.deepcopy(PAGE)
+  page["time_blocks"][0]["time_block_start"] = "December 1"
+  page["time_blocks"][0]["time_block_end"] = "February 20"
+  page["schedule_changes"] = [{"start": "January 6", "end": "January 6", "description": "Closed"}]
+  tuesday = ical.build_events([page], 2025)[0]
+  assert tuesday.until == date(2026, 2, 20)
+  assert tuesday.exdates == [datetime(2026, 1, 6, 10)]
+
+def test_render():
+  text = ical.build_events([PAGE], 2025)[0].render(2, NOW)
+  assert "SEQUENCE:2\r\n" in text
+  assert "DTSTAMP:20250301T000000Z\r\n" in text
+  assert "DTSTART;TZID=America/Toronto:20250311T100000\r\n" in text
+  assert "RRULE:FREQ=WEEKLY;BYDAY=TU;UNTIL=20250421T035959Z\r\n" in text
+  assert "EXDATE;TZID=America/Toronto:20250318T100000,20250325T100000,20250401T100000\r\n" in text
+  assert "LOCATION:Minto Recreation Complex - Barrhaven\r\n" in text
+  assert all(len(line.encode()) <= 75 for line in text.split("\r\n"))
+
+def test_exporter_incremental(tmp_path):
+  other = copy.deepcopy(PAGE)
+  other["location"] = "Walter Baker Sports Centre"
+  other["url"] = "walterbaker"
+  for a in other["time_blocks"][0]["activities"]:
+    a["location"] = "Walter Baker Sports Centre"
+
+  exporter = ical.CalendarExporter(str(tmp_path))
+  result = exporter.export([PAGE, other], now=NOW)
+  assert result.written == ["minto-recreation-complex-barrhaven--preschool-swim.ics", "walter-baker-sports-centre--preschool-swim.ics"]
+  assert result.events_rendered == 6
+  feed = tmp_path / "minto-recreation-complex-barrhaven--preschool-swim.ics"
+  assert feed.read_bytes().startswith(b"BEGIN:VCALENDAR\r\n")
+  assert feed.read_text().count("BEGIN:VEVENT") == 3
+  assert b"X-WR-CALNAME:Preschool swim (Minto Recreation Complex - Barrhaven)\r\n" in feed.read_bytes()
+
+  # a new exporter resumes from saved state; nothing changed, nothing written
+  exporter = ical.CalendarExporter(str(tmp_path))
+  mtime = os.stat(feed).st_mtime_ns
+  result = exporter.export([PAGE, other], now=NOW)
+  assert result.written == [] and result.events_rendered == 0
+  assert os.stat(feed).st_mtime_ns == mtime
+
+  changed = copy.deepcopy(PAGE)
+  changed["time_blocks"][0]["activities"][0]["time_slots"] = "9 - 10am"
+  result = exporter.export([changed, other], now=NOW)
+  assert result.written == ["minto-recreation-complex-barrhaven--preschool-swim.ics"]
+  assert result.events_rendered == 1
+  assert b"SEQUENCE:1\r\n" in feed.read_bytes()
+
+  result = exporter.export([changed], now=NOW)
+  assert result.removed == ["walter-baker-sports-centre--preschool-swim.ics"]
+  assert not (tmp_path / "walter-baker-sports-centre--preschool-swim.ics").exists()
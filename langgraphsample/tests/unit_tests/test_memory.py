@@ -0,0 +1,48 @@
+import asyncio
+import tracemalloc
+
+import pytest
+
+from langgraph.checkpoint.memory import MemorySaver
+from react_agent import memory, soak
+from react_agent.diagnostics import METRICS
+
+def test_rss_bytes():
+  assert memory.rss_bytes() > 0
+
+def test_component_sizes_of_empty_checkpointer():
+  sizes = memory.component_sizes(MemorySaver())
+  assert sizes["checkpointer.threads"] == 0
+  assert sizes["checkpointer.bytes"] == 0
+  assert "schedule.documents" in sizes
+  assert "checkpointer.threads" not in memory.component_sizes()
+  assert sizes["prefetch.running"] == 0 and sizes["llm.queued"] == 0
+
+def test_soak_records_memory_per_run():
+  METRICS.reset()
+  result = asyncio.run(soak.arun_soak(
+    conversations=4, turns=2, warmup=2, sample_every=1, facilities=3,
+    keep_threads=True, memory_diagnostics=True,
+  ))
+  assert not tracemalloc.is_tracing()
+  assert [n for n, _ in result.samples] == [2, 3, 4]
+  assert METRICS.get("memory.records") == 8
+  assert METRICS.get("memory.checkpointer.threads") >= 4
+  assert METRICS.get("memory.checkpointer.bytes") > 0
+  assert METRICS.get("memory.traced_bytes") > 0
+  assert METRICS.get("memory.schedule.documents") > 0
+  # schedule questions went through the tool
+  assert METRICS.get("prefetch.hit") > 0
+
+def test_soak_slope():
+  result = asyncio.run(soak.arun_soak(conversations=30, turns=2, warmup=10, sample_every=5, facilities=3, max_slope=1e6))
+  assert len(result.samples) == 5
+  assert result.passed
+  assert not soak.SoakResult(10, [], 2049.0, 2048).passed
+
+def test_soak_needs_two_samples():
+  with pytest.raises(ValueError, match="fewer than two"):
+    asyncio.run(soak.arun_soak(conversations=10, warmup=10, sample_every=5))
+  with pytest.raises(SystemExit):
+    soak.main(["--conversations", "100", "--warmup", "200"])
+  assert not soak.SoakResult(10, [(10, 1)], 0.0, 2048).passed
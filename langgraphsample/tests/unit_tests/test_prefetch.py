@@ -0,0 +1,111 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessage, HumanMessage
+from react_agent import governor, ottawarec, prefetch
+from react_agent.configuration import Configuration
+from react_agent.diagnostics import METRICS
+from react_agent.retrieval import HybridRetriever
+
+class SlowStore:
+  def __init__(self):
+    self.embeddings = None
+    self.started = asyncio.Event()
+    self.finished = False
+
+  async def aget(self):
+    self.started.set()
+    await asyncio.sleep(0.05)
+    self.finished = True
+    return ottawarec.ScheduleSnapshot.from_pages([])
+
+def tool_call(name):
+  return AIMessage(content="", tool_calls=[{"name": name, "args": {"query": "x"}, "id": "1"}])
+
+def test_looks_like_schedule_query():
+  cases = [
+    ("When is preschool swim at Walter Baker?", True),
+    ("Is the pool open on Sunday?", True),
+    ("any aquafit schedules this week", True),
+    ("What is the capital of France?", False),
+    ("Tell me a joke", False),
+  ]
+  for text, expected in cases:
+    assert prefetch.looks_like_schedule_query(text) == expected, text
+
+def test_prefetch_hit_and_mispredicted(monkeypatch):
+  async def scenario(response):
+    store = SlowStore()
+    monkeypatch.setattr(ottawarec, "get_store", lambda configuration: store)
+    task = prefetch.start_prefetch([HumanMessage(content="preschool swim times?")], Configuration())
+    await store.started.wait()
+    prefetch.settle_prefetch(task, response)
+    await asyncio.gather(task, return_exceptions=True)
+    return task, store
+
+  METRICS.reset()
+  task, store = asyncio.run(scenario(tool_call(ottawarec.get_preschool_swim_times.name)))
+  assert store.finished and not task.cancelled()
+  assert METRICS.get("prefetch.hit") == 1
+
+  task, store = asyncio.run(scenario(AIMessage(content="Paris")))
+  assert task.cancelled() and not store.finished
+  assert METRICS.get("prefetch.mispredicted") == 1
+  assert METRICS.get("prefetch.started") == 2
+
+def test_prefetch_not_started(monkeypatch):
+  async def scenario():
+    monkeypatch.setattr(ottawarec, "get_store", lambda configuration: SlowStore())
+    cases = [
+      ([HumanMessage(content="What is the capital of France?")], Configuration()),
+      ([HumanMessage(content="preschool swim times?"), tool_call("search")], Configuration()),
+      ([HumanMessage(content="preschool swim times?")], Configuration(schedule_prefetch=False)),
+      ([], Configuration()),
+    ]
+    return [prefetch.start_prefetch(messages, configuration) for messages, configuration in cases]
+
+  METRICS.reset()
+  assert asyncio.run(scenario()) == [None] * 4
+  prefetch.settle_prefetch(None, tool_call(ottawarec.get_schedule_times_batch.name))
+  assert METRICS.get("prefetch.missed") == 1
+  assert METRICS.get("prefetch.started") == 0
+
+class RecordingGovernor(governor.LLMGovernor):
+  def __init__(self):
+    super().__init__(max_concurrency=1)
+    self.priorities = []
+
+  async def run(self, call, *, tokens=0, priority=governor.INTERACTIVE):
+    self.priorities.append(priority)
+    return await super().run(call, tokens=tokens, priority=priority)
+
+class WarmStore:
+  def __init__(self):
+    self.governor = RecordingGovernor()
+    self.embeddings = governor.GovernedEmbeddings(DeterministicFakeEmbedding(size=8), self.governor)
+    docs = [Document(id=str(i), page_content=f"Preschool swim {day}") for i, day in enumerate(["Monday", "Friday"])]
+    # never confident, so every query needs the embedding fallback
+    retriever = HybridRetriever(docs, self.embeddings, min_confidence=float("inf"))
+    self.snapshot = ottawarec.ScheduleSnapshot(pages=[], retriever=retriever)
+
+  async def aget(self):
+    return self.snapshot
+
+def test_prefetch_embeds_in_background(monkeypatch):
+  store = WarmStore()
+  monkeypatch.setattr(ottawarec, "get_store", lambda configuration: store)
+  text = "preschool swim times?"
+
+  async def scenario():
+    await prefetch._prefetch(text, Configuration())
+    prefetched = list(store.governor.priorities)
+    results = await store.snapshot.asearch([text], k=1)
+    return prefetched, results
+
+  prefetched, results = asyncio.run(scenario())
+  # the documents and the question, both behind interactive requests
+  assert prefetched == [governor.BACKGROUND, governor.BACKGROUND]
+  # the tool's search reused the index and the question's vector
+  assert store.governor.priorities == prefetched
+  assert len(results[text]) == 1
@@ -0,0 +1,103 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from react_agent import retrieval
+
+LOCATIONS = ["Walter Baker Sports Centre", "Minto Recreation Complex - Barrhaven"]
+ACTIVITIES = ["Preschool swim", "Lane swim"]
+
+def test_extract_filters():
+  tests = [
+    {"input": "", "want": {}},
+    {"input": "when is the next swim?", "want": {}},
+    {"input": "preschool swim at walter baker", "want": {"location": "walter baker sports centre", "activity": "preschool swim"}},
+    {"input": "Lane swim in Barrhaven on Friday", "want": {"location": "minto recreation complex - barrhaven", "activity": "lane swim", "day": "friday"}},
+    # ambiguous mentions are not used to filter
+    {"input": "Monday or Tuesday at the recreation centre", "want": {}},
+  ]
+  for test in tests:
+    assert retrieval.extract_filters(test["input"], LOCATIONS, ACTIVITIES) == test["want"]
+
+def test_matches_filters():
+  doc = Document(page_content="", metadata={"location": "Minto Recreation Complex - Barrhaven"})
+  assert retrieval.matches_filters(doc, {})
+  assert retrieval.matches_filters(doc, {"location": "minto"})
+  # metadata the document does not carry is ignored
+  assert retrieval.matches_filters(doc, {"location": "minto", "day": "monday"})
+  assert not retrieval.matches_filters(doc, {"location": "walter baker"})
+
+def test_bm25_score():
+  index = retrieval.BM25Index(["preschool swim 10am", "lane swim 7am", "public skate"])
+  scored = index.score("preschool swim", [0, 1, 2])
+  assert [i for i, _ in scored] == [0, 1, 2]
+  assert scored[0][1] > scored[1][1] > scored[2][1] == 0
+  assert index.score("unknown words", [0, 1]) == [(0, 0.0), (1, 0.0)]
+
+def test_hybrid_lexical_search():
+  docs = [
+    Document(page_content="Preschool swim Monday 10am", metadata={"location": "Walter Baker Sports Centre"}),
+    Document(page_content="Lane swim Monday 7am", metadata={"location": "Walter Baker Sports Centre"}),
+    Document(page_content="Preschool swim Friday 9am", metadata={"location": "Minto Recreation Complex - Barrhaven"}),
+  ]
+  retriever = retrieval.HybridRetriever(docs, DeterministicFakeEmbedding(size=8))
+  found, confident = retriever.lexical_search("preschool swim monday", {}, k=1)
+  assert confident
+  assert found == [docs[0]]
+  found, confident = retriever.lexical_search("anything", {}, k=1)
+  assert not confident
+  # the vector index is only built on fallback
+  assert retriever._vector_store is None
+
+class AsyncOnlyEmbeddings(DeterministicFakeEmbedding):
+  batches: list = []
+
+  def embed_documents(self, texts):
+    raise AssertionError("must not embed synchronously on the event loop")
+
+  async def aembed_documents(self, texts):
+    self.batches.append(list(texts))
+    await asyncio.sleep(0)
+    return super().embed_documents(texts)
+
+def test_vector_index_built_async_once():
+  docs = [
+    Document(id=str(i), page_content=f"Preschool swim {day}", metadata={"location": "Walter Baker Sports Centre"})
+    for i, day in enumerate(["Monday", "Tuesday", "Friday"])
+  ]
+  embeddings = AsyncOnlyEmbeddings(size=8)
+  retriever = retrieval.HybridRetriever(docs, embeddings)
+
+  async def scenario():
+    return await asyncio.gather(*(retriever.abatch_search([("anything", {})], k=1) for _ in range(3)))
+
+  results = asyncio.run(scenario())
+  assert all(len(r[0]) == 1 for r in results)
+  # one batch indexing the documents, then one per search for its query
+  assert embeddings.batches.count([d.page_content for d in docs]) == 1
+  assert retriever.vector_store.matrix.shape == (3, 8)
+
+class NeverEmbeddings(Embeddings):
+  def embed_documents(self, texts):
+    raise AssertionError("must not embed synchronously on the event loop")
+
+  def embed_query(self, text):
+    raise AssertionError("must not embed synchronously on the event loop")
+
+  async def aembed_documents(self, texts):
+    await asyncio.Event().wait()
+
+def test_vector_index_build_not_behind_prefetch():
+  docs = [Document(id=str(i), page_content=f"Preschool swim {day}") for i, day in enumerate(["Monday", "Friday"])]
+  retriever = retrieval.HybridRetriever(docs, AsyncOnlyEmbeddings(size=8))
+
+  async def scenario():
+    # a prefetch's build, stuck behind interactive requests
+    prefetch = asyncio.create_task(retriever.aindex_vectors(NeverEmbeddings()))
+    await asyncio.sleep(0)
+    store = await asyncio.wait_for(retriever.aindex_vectors(), timeout=1)
+    return store, await asyncio.wait_for(prefetch, timeout=1)
+
+  store, prefetched = asyncio.run(scenario())
+  assert store is prefetched is retriever.vector_store
+  assert store.matrix.shape == (2, 8)
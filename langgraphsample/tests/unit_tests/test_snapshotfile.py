@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from langchain.schema import Document
+from react_agent import snapshotfile
+from react_agent.retrieval import BM25Index, HybridRetriever, matches_filters
+from react_agent.embeddings import HashingEmbeddings
+
+PAGES = [{"location": "Walter Baker Sports Centre", "url": "walterbaker", "time_blocks": [], "schedule_changes": []}]
+
+DOCS = [
+  Document(id="a", page_content="Preschool swim at Walter Baker Sports Centre on Tuesday: 10 - 11am", metadata={
+    "location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday",
+    "time_slots": "10 - 11am", "category": None, "url": "walterbaker",
+  }),
+  Document(id="b", page_content="Lane swim at Walter Baker Sports Centre on Sunday: 12pm - 2pm", metadata={
+    "location": "Walter Baker Sports Centre", "activity": "Lane swim", "day": "Sunday", "rank": 2,
+  }),
+  Document(id="c", page_content="no metadata", metadata={}),
+]
+
+def test_round_trip(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  vectors = HashingEmbeddings().embed_matrix([d.page_content for d in DOCS])
+  snapshotfile.write_snapshot(path, PAGES, DOCS, vectors)
+
+  mapped = snapshotfile.MappedSnapshot(path)
+  assert len(mapped) == 3
+  assert list(mapped.pages) == PAGES
+  assert list(mapped.documents()) == DOCS
+  assert mapped.documents()[1:] == DOCS[1:]
+  assert np.array_equal(mapped.embeddings, vectors)
+  # views onto the mapping rather than copies
+  assert not mapped.embeddings.flags.owndata and not mapped.embeddings.flags.writeable
+  # the location is stored once
+  assert mapped.records[0][2] == mapped.records[1][2]
+
+def test_without_embeddings(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  snapshotfile.write_snapshot(path, [], [])
+  mapped = snapshotfile.MappedSnapshot(path)
+  assert (len(mapped), list(mapped.pages), mapped.embeddings) == (0, [], None)
+  assert mapped.lexical.score("swim", []) == []
+
+def test_replace_keeps_open_readers(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  snapshotfile.write_snapshot(path, PAGES, DOCS[:1])
+  old = snapshotfile.MappedSnapshot(path)
+  snapshotfile.write_snapshot(path, [], DOCS[1:])
+  new = snapshotfile.MappedSnapshot(path)
+  assert list(old.documents()) == DOCS[:1]
+  assert list(new.documents()) == DOCS[1:]
+  assert [p.name for p in tmp_path.iterdir()] == ["snapshot.bin"]
+
+def test_keyword_scores_match_in_memory_index(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  snapshotfile.write_snapshot(path, PAGES, DOCS)
+  mapped = snapshotfile.MappedSnapshot(path).lexical
+  index = BM25Index([d.page_content for d in DOCS])
+  assert mapped.vocabulary_size == index.vocabulary_size
+  for query in ["preschool swim", "Walter Baker on sunday", "lane", "metadata", "badminton", ""]:
+    for candidates in [[0, 1, 2], [2, 0]]:
+      assert mapped.score(query, candidates) == pytest.approx(index.score(query, candidates))
+  changed = mapped.with_changes([2, 0], ["Aquafit at Minto"])
+  expected = index.with_changes([2, 0], ["Aquafit at Minto"])
+  assert changed.score("aquafit swim", [0, 1, 2]) == pytest.approx(expected.score("aquafit swim", [0, 1, 2]))
+
+def test_matching_agrees_with_filters(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  snapshotfile.write_snapshot(path, PAGES, DOCS)
+  documents = snapshotfile.MappedSnapshot(path).documents()
+  assert documents.values("location") == ["Walter Baker Sports Centre"]
+  assert documents.values("activity") == ["Lane swim", "Preschool swim"]
+  tests = [
+    {"activity": "swim"},
+    {"activity": "preschool", "day": "tuesday"},
+    {"location": "minto"},
+    {"category": "none"},
+    {"rank": "2"},
+    {"day": "sunday", "url": "walterbaker"},
+  ]
+  for filters in tests:
+    assert documents.matching(filters) == [i for i, d in enumerate(DOCS) if matches_filters(d, filters)]
+
+class Decoded(snapshotfile.MappedDocuments):
+  def __init__(self, snapshot):
+    super().__init__(snapshot)
+    self.decoded = []
+
+  def __getitem__(self, n):
+    self.decoded.append(n)
+    return super().__getitem__(n)
+
+def test_retriever_decodes_only_results(tmp_path):
+  path = str(tmp_path / "snapshot.bin")
+  snapshotfile.write_snapshot(path, PAGES, DOCS)
+  mapped = snapshotfile.MappedSnapshot(path)
+  documents = Decoded(mapped)
+  retriever = HybridRetriever(documents, HashingEmbeddings(), lexical=mapped.lexical)
+  docs, confident = retriever.lexical_search("preschool swim", retriever.filters_for("preschool swim on tuesday"), k=1)
+  assert [d.id for d in docs] == ["a"] and confident
+  assert documents.decoded == [0]
+
+def test_invalid(tmp_path):
+  cases = [
+    (b"not a snapshot file at all, just some text long enough for a header" * 2, "not a schedule snapshot"),
+    (b"ORECSNAP" + b"\x09\x00\x00\x00" + b"\x00" * snapshotfile._HEADER.size, "Unsupported"),
+  ]
+  for content, message in cases:
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match=message):
+      snapshotfile.MappedSnapshot(str(path))
+  with pytest.raises(ValueError, match="no id"):
+    snapshotfile.write_snapshot(str(tmp_path / "x.bin"), [], [Document(page_content="x")])
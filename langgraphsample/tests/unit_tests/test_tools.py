@@ -1,4 +1,8 @@
+import asyncio
+import copy
+
 from bs4 import BeautifulSoup
+from langchain_core.embeddings import DeterministicFakeEmbedding
 from react_agent import ottawarec
 
 DAYS_OF_THE_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -214,3 +218,112 @@ def test_parse_page():
   # TODO: Create Helper assert functions for time_block and activity
   assert len(parsedPage["time_blocks"][0]["activities"]) == 2
   assert len(parsedPage["time_blocks"][1]["activities"]) == 5
+
+# Parse Schedule Changes
+def test_parse_schedule_changes():
+  tests = [
+    {"input": "<h1>Minto</h1>", "want": []},
+    {
+      "input": "<h2>Schedule changes</h2><p>March 17 to April 6 The pool is closed for annual maintenance.</p><ul><li>April 18: Closed for Good Friday</li><li>Check back soon</li></ul><h2>Contact</h2><p>May 1 not a change</p>",
+      "want": [
+        {"start": "March 17", "end": "April 6", "description": "The pool is closed for annual maintenance."},
+        {"start": "April 18", "end": "April 18", "description": "Closed for Good Friday"},
+      ],
+    },
+  ]
+  for test in tests:
+    assert ottawarec._parse_schedule_changes(BeautifulSoup(
+      markup=test["input"],
+      features="html.parser",
+    )) == test["want"]
+
+# Batch Schedule Queries
+class CountingEmbeddings(DeterministicFakeEmbedding):
+  calls: int = 0
+  texts: list = []
+
+  def embed_documents(self, texts):
+    self.calls += 1
+    self.texts.extend(texts)
+    return super().embed_documents(texts)
+
+PAGES = [
+  {
+    "location": "Walter Baker Sports Centre",
+    "time_blocks": [{"activities": [{"location": "Walter Baker Sports Centre", "activity": "Preschool swim", "day": "Tuesday", "time_slots": "10 - 11am"}]}],
+    "url": "walterbaker",
+  },
+  {
+    "location": "Minto Recreation Complex - Barrhaven",
+    "time_blocks": [{"activities": [{"location": "Minto Recreation Complex - Barrhaven", "activity": "Preschool swim", "day": "Friday", "time_slots": "8 - 9am"}]}],
+    "url": "minto",
+  },
+]
+
+def test_query_key():
+  assert ottawarec.query_key("when is swim?") == "when is swim?"
+  assert ottawarec.query_key({"question": "when is swim?", "day": "Monday"}) == "when is swim? | day=Monday"
+  assert ottawarec.query_key({"question": "when is swim?"}) == "when is swim?"
+  assert ottawarec.query_key({"location": "Minto", "day": "Monday"}) == "location=Minto | day=Monday"
+
+def test_snapshot_asearch_batch():
+  embeddings = CountingEmbeddings(size=32)
+  snapshot = ottawarec.ScheduleSnapshot.from_pages(PAGES, embeddings)
+  results = asyncio.run(snapshot.asearch([
+    "preschool swim at Walter Baker",
+    {"location": "minto", "day": "Friday"},
+    {"location": "nowhere"},
+  ]))
+  # metadata narrows each of these down, so nothing is embedded
+  assert embeddings.calls == 0
+  assert list(results) == ["preschool swim at Walter Baker", "location=minto | day=Friday", "location=nowhere"]
+  assert [d.metadata["location"] for d in results["preschool swim at Walter Baker"]] == ["Walter Baker Sports Centre"]
+  assert [d.metadata["location"] for d in results["location=minto | day=Friday"]] == ["Minto Recreation Complex - Barrhaven"]
+  assert results["location=nowhere"] == []
+
+def test_snapshot_asearch_same_question_per_facility():
+  snapshot = ottawarec.ScheduleSnapshot.from_pages(PAGES, CountingEmbeddings(size=32))
+  results = asyncio.run(snapshot.asearch([
+    {"question": "preschool swim", "location": "Walter Baker"},
+    {"question": "preschool swim", "location": "Minto"},
+  ]))
+  assert list(results) == ["preschool swim | location=Walter Baker", "preschool swim | location=Minto"]
+  assert [d.metadata["location"] for d in results["preschool swim | location=Walter Baker"]] == ["Walter Baker Sports Centre"]
+  assert [d.metadata["location"] for d in results["preschool swim | location=Minto"]] == ["Minto Recreation Complex - Barrhaven"]
+
+def test_snapshot_asearch_embedding_fallback():
+  embeddings = CountingEmbeddings(size=32)
+  snapshot = ottawarec.ScheduleSnapshot.from_pages(PAGES, embeddings)
+  results = asyncio.run(snapshot.asearch(["anything on?", "lessons today", "anything on?"]))
+  # one request to index the documents, one shared by the unsure queries
+  assert embeddings.calls == 2
+  assert list(results) == ["anything on?", "lessons today"]
+  assert len(results["lessons today"]) == 2
+
+# Schedule Store
+def test_store_incremental_refresh(tmp_path, monkeypatch):
+  pages = {p["url"]: copy.deepcopy(p) for p in PAGES}
+  monkeypatch.setattr(ottawarec, "fetch_page", lambda url: copy.deepcopy(pages[url]))
+  embeddings = CountingEmbeddings(size=32)
+  store = ottawarec.ScheduleStore(list(pages), embeddings, max_age_seconds=0, state_dir=str(tmp_path))
+
+  assert len(asyncio.run(store.arefresh())) == 2
+  first = store.snapshot
+  # build the vector index so re-embedding can be observed
+  asyncio.run(first.retriever.aindex_vectors())
+  embeddings.texts.clear()
+
+  assert asyncio.run(store.arefresh()) == []
+  pages["minto"]["time_blocks"][0]["activities"][0]["time_slots"] = "9 - 10am"
+  diff = asyncio.run(store.arefresh())
+  assert [c.op for c in diff] == ["changed"]
+  # only the changed document was embedded again
+  assert embeddings.texts == ["Preschool swim at Minto Recreation Complex - Barrhaven on Friday: 9 - 10am"]
+  assert store.snapshot is not first
+  assert "8 - 9am" in first.retriever.documents[1].page_content
+  assert sorted(d.page_content for d in store.snapshot.retriever.documents) == sorted(d.page_content for d in store.snapshot.retriever.vector_store.documents)
+  assert [e["seq"] for e in store.feed.read()] == [1, 2, 3]
+
+  # a new store resumes from the saved pages
+  restarted = ottawarec.ScheduleStore(list(pages), embeddings, max_age_seconds=0, state_dir=str(tmp_path))
+  assert asyncio.run(restarted.arefresh()) == []
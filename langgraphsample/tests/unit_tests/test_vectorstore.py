@@ -0,0 +1,41 @@
+import numpy as np
+from langchain_core.documents import Document
+from react_agent.embeddings import HashingEmbeddings
+from react_agent.vectorstore import MatrixVectorStore
+
+TEXTS = ["Preschool swim Monday", "Lane swim Tuesday", "Public skate Friday", "Aquafit Sunday"]
+
+def test_similarity_search():
+  store = MatrixVectorStore.from_texts(TEXTS, HashingEmbeddings(size=128), metadatas=[{"n": n} for n in range(4)])
+  assert store.matrix.shape == (4, 128)
+  assert store.matrix.flags["C_CONTIGUOUS"]
+  found = store.similarity_search("preschool swim", k=2)
+  assert [d.page_content for d in found] == ["Preschool swim Monday", "Lane swim Tuesday"]
+  found = store.similarity_search("swim", k=10, filter=lambda d: d.metadata["n"] > 0)
+  assert found[0].page_content == "Lane swim Tuesday"
+  assert len(found) == 3
+
+def test_top_k_batch():
+  store = MatrixVectorStore(HashingEmbeddings())
+  vectors = np.eye(5, dtype=np.float32)
+  store.add_vectors(vectors, [Document(id=str(n), page_content=str(n)) for n in range(5)])
+  queries = np.array([[0, 0, 1, 0, 0.5], [1, 0, 0, 0, 0]], dtype=np.float32)
+  top = store.top_k(queries, 2)
+  assert list(top[0]) == [2, 4]
+  assert top[1][0] == 0
+  assert list(store.top_k(queries, 1, candidates=np.array([3, 4]))[0]) == [4]
+  assert list(store.top_k(queries, 2, candidates=np.array([4, 0]))[1]) == [0, 4]
+  # most of the rows: scored in full rather than copied
+  assert list(store.top_k(queries, 2, candidates=np.array([0, 1, 2, 4]))[0]) == [2, 4]
+  assert list(store.top_k(queries, 1, candidates=np.array([0]))[1]) == [0]
+  assert [len(t) for t in store.top_k(queries, 1, candidates=np.array([], dtype=np.intp))] == [0, 0]
+
+def test_add_and_delete():
+  store = MatrixVectorStore(HashingEmbeddings(size=16))
+  for text in TEXTS:
+    store.add_texts([text], ids=[text])
+  assert store.matrix.shape == (4, 16)
+  store.delete(["Lane swim Tuesday"])
+  assert store.ids == ["Preschool swim Monday", "Public skate Friday", "Aquafit Sunday"]
+  assert store.matrix.shape == (3, 16)
+  assert store.similarity_search("lane swim tuesday", k=1)[0].page_content != "Lane swim Tuesday"